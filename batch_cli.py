@@ -0,0 +1,282 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from image_processing import ProcessingParams, process_image
+from tiled_processing import process_image_tiled, TILED_PROCESSING_PIXELS
+
+# Same warning filters as main.py
+warnings.filterwarnings("ignore", category=FutureWarning, module="easyocr.detection")
+warnings.filterwarnings("ignore", category=UserWarning, module="ollama")
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+STAGES = ('decode', 'process', 'write', 'ocr', 'llava')
+
+def find_images(inputs, file_list=None):
+    # (path, output name) for every image file given directly, listed in
+    # file_list, or found under a given directory (keeping its relative path)
+    paths = list(inputs)
+    if file_list:
+        with open(file_list) as f:
+            paths += [line.strip() for line in f if line.strip()]
+    images = []
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files_in_dir in os.walk(path):
+                for name in sorted(files_in_dir):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        full_path = os.path.join(root, name)
+                        images.append((full_path, os.path.relpath(full_path, path)))
+        else:
+            files.append(len(images))
+            images.append((path, os.path.basename(path)))
+    stems = [os.path.splitext(images[i][1])[0] for i in files]
+    if len(set(stems)) < len(stems):
+        # Single files with the same base name (a/card.jpg, b/card.jpg) keep their
+        # path below the common parent instead
+        parent = os.path.commonpath([os.path.dirname(os.path.abspath(images[i][0])) for i in files])
+        for i in files:
+            images[i] = (images[i][0], os.path.relpath(os.path.abspath(images[i][0]), parent))
+    return images
+
+def duplicate_outputs(images):
+    # Output names that more than one input would be written to
+    seen = set()
+    duplicates = set()
+    for _, name in images:
+        stem = os.path.normcase(os.path.splitext(name)[0])
+        if stem in seen:
+            duplicates.add(name)
+        seen.add(stem)
+    return sorted(duplicates)
+
+def output_format(value):
+    # --format accepts 'png' as well as '.png'
+    extension = value.lower() if value.startswith('.') else '.' + value.lower()
+    if not cv2.haveImageWriter('image' + extension):
+        raise argparse.ArgumentTypeError(f"cannot write {extension} images")
+    return extension
+
+def load_preset(path):
+    if not path:
+        return ProcessingParams()
+    with open(path) as f:
+        return ProcessingParams.from_dict(json.load(f))
+
+def preset_id(params):
+    return hashlib.blake2b(json.dumps(params.to_dict(), sort_keys=True).encode(), digest_size=8).hexdigest()
+
+def completed_inputs(results_path, params_id):
+    # Inputs that already have a successful record for this preset
+    done = set()
+    if not os.path.exists(results_path):
+        return done
+    with open(results_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Last line of an interrupted run
+            if record.get('status') == 'ok' and record.get('preset') == params_id:
+                done.add(record['input'])
+    return done
+
+class BatchRunner:
+    def __init__(self, args, params):
+        self.args = args
+        self.params = params
+        self.params_id = preset_id(params)
+        self.results_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.processed = 0
+        self.failed = 0
+        # Ollama serves one request per model at a time by default
+        self.llava_slots = threading.Semaphore(args.llava_concurrency)
+        self.ocr_cache = None
+        self.llava_cache = None
+        if args.ocr and not args.no_cache:
+            from ocr_cache import OCRCache, cache_path
+            self.ocr_cache = OCRCache(disk_path=cache_path('ocr_cache.sqlite3'))
+        if args.llava and not args.no_cache:
+            from llava_cache import LlavaCache
+            from ocr_cache import cache_path
+            self.llava_cache = LlavaCache(cache_path('llava_cache.sqlite3'))
+
+    def render(self, img):
+        if img.shape[0] * img.shape[1] > TILED_PROCESSING_PIXELS:
+            return process_image_tiled(img, self.params)
+        return process_image(img, self.params)
+
+    def run_ocr(self, img, result):
+        from ocr_engines import recognize_batch
+        ocr_img, preprocess = result, False
+        if self.args.ocr_from_source:
+            # Like the app's default: geometry only, then OCR preprocessing
+            geometry = ProcessingParams(rotation=self.params.rotation, flip=self.params.flip)
+            ocr_img, preprocess = process_image(img, geometry), True
+        return {engine: recognize_batch([ocr_img], engine, self.args.ocr_languages, cache=self.ocr_cache,
+                                        preprocess=preprocess)[0]
+                for engine in self.args.ocr}
+
+    def run_llava(self, img):
+        from llava_payload import encode_for_llava
+        from ollama_client import stream_analysis, LLAVA_MODEL, LLAVA_PROMPT
+        model = self.args.llava_model or LLAVA_MODEL
+        prompt = self.args.llava_prompt or LLAVA_PROMPT
+        payload, _ = encode_for_llava(img)
+        cache_key = None
+        if self.llava_cache is not None:
+            cache_key = self.llava_cache.key(payload, prompt, model)
+            cached = None if self.args.refresh else self.llava_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        with self.llava_slots:
+            content = ''.join(stream_analysis(payload, model, prompt, self.args.llava_host))
+        if cache_key is not None and content:
+            self.llava_cache.put(cache_key, content)
+        return content
+
+    def decode(self, path):
+        img = cv2.imread(path)
+        if img is None:
+            raise IOError(f"Could not decode {path}")
+        return img
+
+    def write_output(self, result, output_name):
+        output_path = os.path.join(self.args.output_dir, os.path.splitext(output_name)[0] + self.args.format)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        if not cv2.imwrite(output_path, result):
+            raise IOError(f"Could not write {output_path}")
+        return output_path
+
+    def new_record(self, path):
+        return {'input': path, 'preset': self.params_id, 'status': 'ok', 'timings_ms': {}}
+
+    def process(self, path, output_name):
+        record = self.new_record(path)
+        timings = {}
+        try:
+            started = time.perf_counter()
+            img = self.decode(path)
+            timings['decode'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            result = self.render(img)
+            timings['process'] = time.perf_counter() - started
+
+            if self.args.output_dir:
+                started = time.perf_counter()
+                record['output'] = self.write_output(result, output_name)
+                timings['write'] = time.perf_counter() - started
+
+            if self.args.ocr:
+                started = time.perf_counter()
+                record['ocr'] = self.run_ocr(img, result)
+                timings['ocr'] = time.perf_counter() - started
+
+            if self.args.llava:
+                started = time.perf_counter()
+                record['llava'] = self.run_llava(result)
+                timings['llava'] = time.perf_counter() - started
+        except Exception as e:
+            record['status'] = 'error'
+            record['error'] = str(e)
+            print(f"Error processing {path}: {str(e)}")
+        return self.record_result(record, timings)
+
+    def record_result(self, record, timings):
+        record['timings_ms'] = {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()}
+        with self.stats_lock:
+            for stage, seconds in timings.items():
+                self.stage_seconds[stage] += seconds
+            if record['status'] == 'ok':
+                self.processed += 1
+            else:
+                self.failed += 1
+        with self.results_lock:
+            # One flushed line per image, so an interrupted run can resume
+            self.results.write(json.dumps(record) + '\n')
+            self.results.flush()
+        return record
+
+    def run(self, images):
+        done = set() if self.args.no_resume else completed_inputs(self.args.results, self.params_id)
+        pending = [(path, name) for path, name in images if path not in done]
+        print(f"{len(images)} images, {len(images) - len(pending)} already done, "
+              f"{len(pending)} to process with {self.args.workers} workers")
+        if self.args.ocr and 'EasyOCR' in self.args.ocr:
+            from ocr_engines import get_easyocr_reader
+            get_easyocr_reader(self.args.ocr_languages)  # Load the model before timing starts
+
+        started = time.perf_counter()
+        with self.open_results():
+            with ThreadPoolExecutor(max_workers=self.args.workers) as executor:
+                for count, _ in enumerate(executor.map(lambda item: self.process(*item), pending), 1):
+                    if count % 50 == 0:
+                        print(f"{count}/{len(pending)} images")
+        self.print_summary(time.perf_counter() - started)
+
+    def open_results(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.args.results)), exist_ok=True)
+        self.results = open(self.args.results, 'a')
+        return self.results
+
+    def print_summary(self, elapsed):
+        rate = self.processed / elapsed if elapsed > 0 else 0.0
+        print(f"Processed {self.processed} images ({self.failed} failed) in {elapsed:.1f} s, {rate:.2f} images/s")
+        for stage in STAGES:
+            seconds = self.stage_seconds[stage]
+            if seconds:
+                print(f"  {stage:<8} {seconds:8.1f} s total, {seconds * 1000 / max(self.processed + self.failed, 1):8.1f} ms per image")
+
+def add_pipeline_arguments(parser):
+    # Options shared with watch_ingest.py
+    parser.add_argument('--preset', help="JSON file of ProcessingParams values (missing keys keep their defaults)")
+    parser.add_argument('--output-dir', help="where processed images are written; omit to skip writing")
+    parser.add_argument('--format', type=output_format, default='.png', help="output image extension (default: .png)")
+    parser.add_argument('--results', default='results.jsonl', help="JSONL file with one record per image")
+    parser.add_argument('--ocr', nargs='+', choices=['EasyOCR', 'Tesseract'], help="OCR engines to run")
+    parser.add_argument('--ocr-languages', nargs='+', default=['en'], help="OCR languages (default: en)")
+    parser.add_argument('--ocr-from-source', action='store_true',
+                        help="OCR the source pixels (rotation/flip only, with OCR preprocessing) like the app does")
+    parser.add_argument('--llava', action='store_true', help="run Llava analysis on each processed image")
+    parser.add_argument('--llava-model', help="Ollama model name")
+    parser.add_argument('--llava-prompt', help="prompt sent with each image")
+    parser.add_argument('--llava-host', help="Ollama server URL")
+    parser.add_argument('--llava-concurrency', type=int, default=1, help="concurrent Llava requests (default: 1)")
+    parser.add_argument('--no-cache', action='store_true', help="do not use the OCR and Llava result caches")
+    parser.add_argument('--refresh', action='store_true', help="ignore cached Llava answers and replace them")
+    parser.add_argument('--no-resume', action='store_true', help="process inputs that already have results")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Apply a processing preset to many images without the GUI")
+    parser.add_argument('inputs', nargs='*', help="image files and/or directories (searched recursively)")
+    parser.add_argument('--file-list', help="text file with one image path per line")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="images processed in parallel")
+    add_pipeline_arguments(parser)
+    args = parser.parse_args(argv)
+    if not args.inputs and not args.file_list:
+        parser.error("no inputs given")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    images = find_images(args.inputs, args.file_list)
+    duplicates = duplicate_outputs(images)
+    if args.output_dir and duplicates:
+        print(f"Several inputs would be written to the same output: {', '.join(duplicates)}")
+        return 2
+    runner = BatchRunner(args, load_preset(args.preset))
+    runner.run(images)
+    return 1 if runner.failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,252 @@
+import argparse
+import difflib
+import json
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+import numpy as np
+from image_processing import STAGES, ProcessingParams, process_image, cv_to_qimage
+from tiled_processing import process_image_tiled
+
+DEFAULT_SIZES = [1, 4, 12, 24, 100]  # megapixels
+# A benchmark regresses when its median is this fraction slower than the
+# baseline and also slower by at least MIN_REGRESSION_MS
+DEFAULT_THRESHOLD = 0.2
+MIN_REGRESSION_MS = 2.0
+BENCHMARK_TEXT = ['PIKACHU  HP 60', 'Thunder Shock  30', 'Card 025/165']
+
+# Parameters that turn on one stage at a time, with typical slider values
+STAGE_PARAMS = {
+    'tone': ProcessingParams(brightness=20, contrast=15, color_balance_red=10),
+    'hue_saturation': ProcessingParams(saturation=30, hue=10),
+    'blur': ProcessingParams(blur=3),
+    'sharpen': ProcessingParams(sharpen=2),
+    'gamma': ProcessingParams(gamma=15, blur=1),  # blur keeps gamma out of the tone table
+    'noise': ProcessingParams(noise=10),
+    'edge_detection': ProcessingParams(edge_detection=100),
+    'greyscale': ProcessingParams(greyscale=True),
+    'invert': ProcessingParams(invert=True),
+    'sepia': ProcessingParams(sepia=True),
+    'rotation': ProcessingParams(rotation=1),
+    'flip': ProcessingParams(flip=1),
+}
+
+# Whole-chain parameter sets
+CHAIN_PARAMS = {
+    'identity': ProcessingParams(),
+    'tone_gamma': ProcessingParams(brightness=10, contrast=20, gamma=12),
+    'scan_cleanup': ProcessingParams(contrast=25, sharpen=1, greyscale=True),
+    'full': ProcessingParams(brightness=10, contrast=10, saturation=20, hue=5, blur=2, sharpen=1, gamma=12,
+                             edge_detection=80, sepia=True, rotation=1, flip=1),
+}
+
+def synthetic_image(megapixels, seed=0):
+    # Deterministic 4:3 card-like image: gradient, noise and a few lines of text
+    height = int(round((megapixels * 1e6 * 3 / 4) ** 0.5))
+    width = int(round(height * 4 / 3))
+    rng = np.random.default_rng(seed)
+    ramp = np.linspace(60, 200, width, dtype=np.float32)
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[:] = np.stack([ramp, ramp[::-1], np.full_like(ramp, 150)], axis=-1).astype(np.uint8)
+    cv2.add(img, rng.integers(0, 20, (height, width, 3), dtype=np.uint8), dst=img)
+    scale = width / 1000
+    for i, line in enumerate(BENCHMARK_TEXT):
+        cv2.putText(img, line, (int(60 * scale), int((120 + 90 * i) * scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                    1.5 * scale, (20, 20, 20), max(1, int(3 * scale)), cv2.LINE_AA)
+    return img
+
+def fixture_image(path, megapixels):
+    img = cv2.imread(path)
+    if img is None:
+        raise IOError(f"Could not decode {path}")
+    scale = (megapixels * 1e6 / (img.shape[0] * img.shape[1])) ** 0.5
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=interpolation)
+
+def measure(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - started) * 1000)
+    return {'median_ms': round(statistics.median(runs), 3), 'min_ms': round(min(runs), 3), 'runs': len(runs)}
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    # Answers /api/chat like Ollama does, as a short NDJSON stream
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        lines = [{'model': body.get('model'), 'message': {'role': 'assistant', 'content': part}, 'done': False}
+                 for part in ('Name: Pikachu', ', HP: 60', ', Card number: 025')]
+        lines.append({'model': body.get('model'), 'message': {'role': 'assistant', 'content': ''}, 'done': True})
+        data = ''.join(json.dumps(line) + '\n' for line in lines).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def start_stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOllamaHandler)
+    threading.Thread(target=server.serve_forever, name='stub-ollama', daemon=True).start()
+    return server
+
+def bench_stages(img, label, repeat, results):
+    for name, key_fn, apply, _ in STAGES:
+        key = key_fn(STAGE_PARAMS[name])
+        results[f"stage/{name}/{label}"] = measure(lambda: apply(img, key), repeat)
+
+def bench_chains(img, label, repeat, results):
+    for name, params in CHAIN_PARAMS.items():
+        results[f"chain/{name}/{label}"] = measure(lambda: process_image(img, params), repeat)
+        results[f"chain_tiled/{name}/{label}"] = measure(lambda: process_image_tiled(img, params), repeat)
+
+def bench_convert(img, label, repeat, results):
+    from image_frame import ImageFrame
+    rotated = np.rot90(img)
+    results[f"convert/cv_to_qimage/{label}"] = measure(lambda: cv_to_qimage(img), repeat)
+    results[f"convert/cv_to_qimage_rotated/{label}"] = measure(lambda: cv_to_qimage(rotated), repeat)
+    frame = ImageFrame()
+    frame.resize(800, 600)
+    results[f"convert/set_image/{label}"] = measure(lambda: frame.set_image(img), repeat)
+
+def bench_ocr(img, label, repeat, results):
+    try:
+        import ocr_engines
+    except ImportError as e:
+        print(f"Skipping OCR: {str(e)}")
+        return
+    for engine in ocr_engines.OCR_ENGINES:
+        texts = []
+        # recognize_batch raises on failure, unlike OCRWorker, so a broken engine
+        # is skipped instead of being timed
+        run = lambda: texts.append(ocr_engines.recognize_batch([img], engine)[0])
+        try:
+            if engine == 'EasyOCR':
+                ocr_engines._easyocr_readers.clear()  # Cold includes loading the model
+            cold = measure(run, 1, warmup=0)
+            warm = measure(run, repeat, warmup=0)
+        except Exception as e:
+            print(f"Skipping {engine}: {str(e)}")
+            continue
+        results[f"ocr/{engine}/cold/{label}"] = cold
+        results[f"ocr/{engine}/warm/{label}"] = warm
+        # Character-level similarity with the text drawn into the image
+        expected = ' '.join(' '.join(BENCHMARK_TEXT).split())
+        found = ' '.join(texts[-1].split()) if texts else ''
+        warm['accuracy'] = round(difflib.SequenceMatcher(None, expected.lower(), found.lower()).ratio(), 3)
+
+def bench_llava(img, label, repeat, results, host):
+    from llava_payload import encode_for_llava
+    from ollama_client import stream_analysis
+    results[f"llava/encode/{label}"] = measure(lambda: encode_for_llava(img), repeat)
+    payload, _ = encode_for_llava(img)
+    results[f"llava/encode/{label}"]['payload_bytes'] = len(payload)
+    results[f"llava/request/{label}"] = measure(lambda: ''.join(stream_analysis(payload, host=host)), repeat)
+
+def run_benchmarks(args):
+    groups = set(args.only or ['stages', 'chain', 'convert', 'ocr', 'llava'])
+    results = {}
+    app = None
+    if 'convert' in groups:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication.instance() or QApplication([])
+    server = start_stub_server() if 'llava' in groups else None
+
+    for megapixels in args.sizes:
+        img = fixture_image(args.fixture, megapixels) if args.fixture else synthetic_image(megapixels)
+        label = f"{megapixels:g}mp"
+        print(f"Benchmarking {img.shape[1]}x{img.shape[0]} ({label})")
+        if 'stages' in groups:
+            bench_stages(img, label, args.repeat, results)
+        if 'chain' in groups:
+            bench_chains(img, label, args.repeat, results)
+        if 'convert' in groups:
+            bench_convert(img, label, args.repeat, results)
+        if 'llava' in groups:
+            bench_llava(img, label, args.repeat, results, f"http://127.0.0.1:{server.server_address[1]}")
+        del img
+
+    if 'ocr' in groups:
+        # OCR runs on crop-sized images, as in the app
+        img = fixture_image(args.fixture, args.ocr_size) if args.fixture else synthetic_image(args.ocr_size)
+        bench_ocr(img, f"{args.ocr_size:g}mp", args.repeat, results)
+
+    if server is not None:
+        server.shutdown()
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'sizes_mp': args.sizes,
+            'repeat': args.repeat,
+            'fixture': args.fixture,
+        },
+        'results': results,
+    }
+
+def compare(report, baseline, threshold, min_ms=MIN_REGRESSION_MS):
+    # Names of benchmarks that are slower than the baseline beyond the threshold
+    regressions = []
+    for name, result in sorted(report['results'].items()):
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        current_ms, baseline_ms = result['median_ms'], previous['median_ms']
+        ratio = current_ms / baseline_ms if baseline_ms else float('inf')
+        regressed = ratio > 1 + threshold and current_ms - baseline_ms > min_ms
+        if regressed or ratio < 1 - threshold:
+            print(f"{'REGRESSION' if regressed else 'faster':<10} {name:<45} {baseline_ms:10.2f} -> {current_ms:10.2f} ms "
+                  f"({ratio:.2f}x)")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time the image pipeline, conversions, OCR and Llava encoding")
+    parser.add_argument('--sizes', nargs='+', type=float, default=DEFAULT_SIZES, help="image sizes in megapixels")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per benchmark (the median is reported)")
+    parser.add_argument('--only', nargs='+', choices=['stages', 'chain', 'convert', 'ocr', 'llava'],
+                        help="benchmark groups to run (default: all)")
+    parser.add_argument('--fixture', help="image file to scale to each size instead of the synthetic card")
+    parser.add_argument('--ocr-size', type=float, default=1, help="image size in megapixels for the OCR benchmarks")
+    parser.add_argument('--output', default='benchmark.json', help="where to write the results")
+    parser.add_argument('--baseline', help="earlier results to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown as a fraction of the baseline (default: 0.2)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmarks(args)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(report['results'])} results to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmarks regressed by more than {args.threshold:.0%}")
+            return 1
+        print("No regressions")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
@@ -1,7 +1,36 @@
 from PyQt5.QtWidgets import QWidget, QVBoxLayout
-from PyQt5.QtCore import Qt, QPoint, QRect, pyqtSignal
-from PyQt5.QtGui import QPainter, QPen, QColor, QPixmap, QImage, QPolygon
+from PyQt5.QtCore import Qt, QPoint, QRect, QTimer, pyqtSignal
+from PyQt5.QtGui import QPainter, QPen, QColor, QPixmap, QPolygon
 import cv2
+from dataclasses import dataclass, replace
+from image_processing import cv_to_qimage
+
+# Delay after the last resize before the frame is rescaled smoothly
+SMOOTH_SCALE_DELAY_MS = 150
+# Screen distance between stored vertices of a freehand polygon
+POLYGON_VERTEX_SPACING = 8
+
+# One selection in full-resolution image coordinates. Rectangles and triangles
+# are two corner points whatever the drag length; polygons keep a vertex every
+# POLYGON_VERTEX_SPACING screen pixels.
+@dataclass(frozen=True)
+class Selection:
+    mode: str
+    points: tuple  # ((x, y), ...)
+
+    def bounds(self):
+        # (x1, y1, x2, y2) of the enclosing box
+        xs = [x for x, _ in self.points]
+        ys = [y for _, y in self.points]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def extended(self, point, min_distance=0):
+        if self.mode != 'polygon':
+            return replace(self, points=(self.points[0], point))
+        last = self.points[-1]
+        if abs(point[0] - last[0]) + abs(point[1] - last[1]) < min_distance:
+            return self
+        return replace(self, points=self.points + (point,))
 
 class ImageFrame(QWidget):
     selection_changed = pyqtSignal()  # Define the signal here
@@ -9,39 +38,92 @@ class ImageFrame(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.image = None
+        self.image_size = None  # (width, height) of the full-resolution image
         self.pixmap = None
+        self.pyramid = []  # self.pixmap, then halved copies, built as needed
         self.scaled_pixmap = None
+        self.scaled_smooth = False
+        self.smooth_timer = QTimer(self)
+        self.smooth_timer.setSingleShot(True)
+        self.smooth_timer.setInterval(SMOOTH_SCALE_DELAY_MS)
+        self.smooth_timer.timeout.connect(self.finish_resize)
         self.selections = []
         self.current_selection = None
+        self.base_layer = None  # Background, scaled image and finished selections
         self.setMinimumSize(400, 400)
         self.selection_mode = 'rectangle'  # Default selection mode
 
-    def set_image(self, image):
+    def set_image(self, image, image_size=None):
+        # image may be a reduced preview; selections are always kept in the
+        # coordinates of the full-resolution image of size image_size
         self.image = image
         if self.image is not None:
-            height, width, channel = self.image.shape
-            bytes_per_line = 3 * width
-            q_image = QImage(self.image.data, width, height, bytes_per_line, QImage.Format_RGB888).rgbSwapped()
-            self.pixmap = QPixmap.fromImage(q_image)
+            self.image_size = image_size or (image.shape[1], image.shape[0])
+            # The pixmap upload is the only copy of the pixels
+            self.pixmap = QPixmap.fromImage(cv_to_qimage(self.image))
         else:
+            self.image_size = None
             self.pixmap = None
+        self.pyramid = [self.pixmap] if self.pixmap else []
+        self.scaled_pixmap = None
         self.update_scaled_pixmap()
         self.update()
 
-    def update_scaled_pixmap(self):
+    def pyramid_level(self, width, height):
+        # Smallest pyramid level that is still at least width x height. Each
+        # level is a smooth 2x reduction of the one above, so scaling from it
+        # is both cheap and free of aliasing.
+        level = self.pyramid[0]
+        for i in range(1, 16):
+            if level.width() < 2 * max(width, 1) or level.height() < 2 * max(height, 1):
+                break
+            if i == len(self.pyramid):
+                self.pyramid.append(level.scaled(level.width() // 2, level.height() // 2,
+                                                 Qt.IgnoreAspectRatio, Qt.SmoothTransformation))
+            level = self.pyramid[i]
+        return level
+
+    def update_scaled_pixmap(self, smooth=True):
         if self.pixmap:
             margin_percent = 0.00  # 5% margin
             available_width = int(self.width() * (1 - 2 * margin_percent))
             available_height = int(self.height() * (1 - 2 * margin_percent))
-            self.scaled_pixmap = self.pixmap.scaled(available_width, available_height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            size = self.pixmap.size().scaled(available_width, available_height, Qt.KeepAspectRatio)
+            if self.scaled_pixmap and smooth == self.scaled_smooth and self.scaled_pixmap.size() == size:
+                return
+            transform = Qt.SmoothTransformation if smooth else Qt.FastTransformation
+            level = self.pyramid_level(size.width(), size.height())
+            self.scaled_pixmap = level.scaled(size, Qt.IgnoreAspectRatio, transform)
+            self.scaled_smooth = smooth
         else:
             self.scaled_pixmap = None
+        self.base_layer = None
+
+    def finish_resize(self):
+        self.update_scaled_pixmap()
+        self.update()
 
     def paintEvent(self, event):
         painter = QPainter(self)
-        painter.fillRect(self.rect(), Qt.white)  # Fill background with white
+        if self.base_layer is None or self.base_layer.size() != self.size() * self.devicePixelRatioF():
+            self.base_layer = self.render_base_layer()
+        # Only the damaged area is copied; a drag repaints little more than the
+        # selection being drawn
+        rect = event.rect()
+        ratio = self.base_layer.devicePixelRatio()
+        painter.drawPixmap(rect, self.base_layer, QRect(rect.topLeft() * ratio, rect.size() * ratio))
+
+        if self.scaled_pixmap and self.current_selection:
+            painter.setPen(QPen(QColor(0, 255, 0), 2, Qt.SolidLine))
+            self.draw_selection(painter, self.current_selection)
 
+    def render_base_layer(self):
+        ratio = self.devicePixelRatioF()
+        layer = QPixmap(self.size() * ratio)
+        layer.setDevicePixelRatio(ratio)
+        layer.fill(Qt.white)  # Fill background with white
         if self.scaled_pixmap:
+            painter = QPainter(layer)
             # Calculate position to center the image
             x = (self.width() - self.scaled_pixmap.width()) // 2
             y = (self.height() - self.scaled_pixmap.height()) // 2
@@ -51,49 +133,67 @@ class ImageFrame(QWidget):
             painter.setPen(QPen(QColor(0, 255, 0), 2, Qt.SolidLine))
             for selection in self.selections:
                 self.draw_selection(painter, selection)
-            
-            if self.current_selection:
-                self.draw_selection(painter, self.current_selection)
+            painter.end()
+        return layer
 
     def set_selection_mode(self, mode):
+        # Applies to new selections; existing ones keep their own shape
         self.selection_mode = mode
-        self.update()
 
     def draw_selection(self, painter, selection):
-        if len(selection) < 2:
-            return
+        points = [self.map_from_image_coordinates(point) for point in selection.points]
+        start, end = points[0], points[-1]
 
-        start = self.map_from_image_coordinates(selection[0])
-        end = self.map_from_image_coordinates(selection[-1])
-
-        if self.selection_mode == 'rectangle':
+        if selection.mode == 'rectangle':
             painter.drawRect(QRect(start, end))
-        elif self.selection_mode == 'triangle':
+        elif selection.mode == 'triangle':
             points = QPolygon([
                 start,
                 QPoint(end.x(), start.y()),
                 end
             ])
             painter.drawPolygon(points)
+        elif selection.mode == 'polygon':
+            painter.drawPolygon(QPolygon(points))
+
+    def selection_widget_rect(self, selection):
+        # Widget area covered by a selection, with room for the pen
+        x1, y1, x2, y2 = selection.bounds()
+        return QRect(self.map_from_image_coordinates((x1, y1)),
+                     self.map_from_image_coordinates((x2, y2))).normalized().adjusted(-3, -3, 3, 3)
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
-        self.update_scaled_pixmap()
+        # Fast scaling while the size keeps changing, a smooth pass once it settles
+        self.update_scaled_pixmap(smooth=False)
+        self.smooth_timer.start()
 
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
-            self.current_selection = [self.map_to_image_coordinates(event.pos())]
-            self.update()
+            point = self.map_to_image_coordinates(event.pos())
+            if point is not None:
+                self.current_selection = Selection(self.selection_mode, (point, point))
+                self.update(self.selection_widget_rect(self.current_selection))
 
     def mouseMoveEvent(self, event):
         if event.buttons() & Qt.LeftButton and self.current_selection:
-            self.current_selection.append(self.map_to_image_coordinates(event.pos()))
-            self.update()
+            point = self.map_to_image_coordinates(event.pos())
+            if point is None:
+                return
+            spacing = POLYGON_VERTEX_SPACING * self.image_size[0] / self.scaled_pixmap.width()
+            selection = self.current_selection.extended(point, spacing)
+            if selection is self.current_selection:
+                return
+            # Repaint the union of where the selection was and where it is now
+            damaged = self.selection_widget_rect(self.current_selection)
+            self.current_selection = selection
+            self.update(damaged.united(self.selection_widget_rect(selection)))
 
     def mouseReleaseEvent(self, event):
         if event.button() == Qt.LeftButton and self.current_selection:
-            self.selections.append([p for p in self.current_selection if p is not None])
+            self.selections.append(self.current_selection)
             self.current_selection = None
+            self.base_layer = None
             self.update()
             self.selection_changed.emit()  # This line should now work
 
@@ -108,13 +208,13 @@ class ImageFrame(QWidget):
         if not pixmap_rect.contains(point):
             return None
         
-        x_ratio = self.pixmap.width() / pixmap_rect.width()
-        y_ratio = self.pixmap.height() / pixmap_rect.height()
+        x_ratio = self.image_size[0] / pixmap_rect.width()
+        y_ratio = self.image_size[1] / pixmap_rect.height()
         
         x = (point.x() - pixmap_rect.left()) * x_ratio
         y = (point.y() - pixmap_rect.top()) * y_ratio
         
-        return QPoint(int(x), int(y))
+        return int(x), int(y)
 
     def map_from_image_coordinates(self, point):
         if not self.scaled_pixmap or point is None:
@@ -124,11 +224,11 @@ class ImageFrame(QWidget):
         y = (self.height() - self.scaled_pixmap.height()) // 2
         pixmap_rect = QRect(x, y, self.scaled_pixmap.width(), self.scaled_pixmap.height())
         
-        x_ratio = pixmap_rect.width() / self.pixmap.width()
-        y_ratio = pixmap_rect.height() / self.pixmap.height()
+        x_ratio = pixmap_rect.width() / self.image_size[0]
+        y_ratio = pixmap_rect.height() / self.image_size[1]
         
-        x = point.x() * x_ratio + pixmap_rect.left()
-        y = point.y() * y_ratio + pixmap_rect.top()
+        x = point[0] * x_ratio + pixmap_rect.left()
+        y = point[1] * y_ratio + pixmap_rect.top()
         
         return QPoint(int(x), int(y))
 
@@ -137,4 +237,5 @@ class ImageFrame(QWidget):
 
     def clear_selections(self):
         self.selections.clear()
+        self.base_layer = None
         self.update()
\ No newline at end of file
@@ -1,68 +1,222 @@
 import cv2
 import numpy as np
+from dataclasses import dataclass, asdict, replace
+from functools import lru_cache
+from PyQt5 import sip
 from PyQt5.QtGui import QImage
 
-def process_image(img, controls):
-    #print("Processing image with controls:", controls.keys())  # Debug print
-    gamma = controls['Gamma'].value() / 10.0
-    gamma_table = np.array([((i / 255.0) ** (1.0 / gamma)) * 255 for i in np.arange(0, 256)]).astype("uint8")
-
-    img = cv2.add(img, np.array([controls['Brightness'].value()] * 3, dtype=np.int16))
-    img = cv2.convertScaleAbs(img, alpha=1 + controls['Contrast'].value() / 100.0, beta=0)
-
-    for i, color in enumerate(['Blue', 'Green', 'Red']):
-        img[:,:,i] = cv2.add(img[:,:,i], controls[f'Color Balance {color}'].value())
-
-    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV).astype(np.float32)
-    hsv[:,:,1] *= (1 + controls['Saturation'].value() / 100.0)
-    hsv[:,:,0] = (hsv[:,:,0] + controls['Hue'].value()) % 180
-    img = cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2BGR)
-
-    if controls['Blur'].value() > 0:
-        img = cv2.GaussianBlur(img, (controls['Blur'].value() * 2 + 1, controls['Blur'].value() * 2 + 1), 0)
-
-    if controls['Sharpen'].value() > 0:
-        kernel = np.array([[-1, -1, -1], [-1, 9 + controls['Sharpen'].value(), -1], [-1, -1, -1]])
-        img = cv2.filter2D(img, -1, kernel)
-
-    img = cv2.LUT(img, gamma_table)
-
-    if controls['Noise'].value() > 0:
-        noise = np.random.normal(0, controls['Noise'].value(), img.shape).astype(np.uint8)
-        img = cv2.add(img, noise)
-
-    if controls['Edge Detection'].value() > 0:
-        edges = cv2.Canny(img, controls['Edge Detection'].value(), controls['Edge Detection'].value() * 2)
-        img = cv2.addWeighted(img, 1, cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR), 0.5, 0)
-
-    if controls['Greyscale'].isChecked():
-        img = cv2.cvtColor(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), cv2.COLOR_GRAY2BGR)
-
-    if controls['Invert'].isChecked():
-        img = cv2.bitwise_not(img)
-
-    if controls['Sepia'].isChecked():
-        sepia_kernel = np.array([[0.272, 0.534, 0.131],
-                                 [0.349, 0.686, 0.168],
-                                 [0.393, 0.769, 0.189]])
-        img = cv2.transform(img, sepia_kernel)
-
-    # Rotation
-    rotation_index = controls['Rotation'].currentIndex()
-    if rotation_index > 0:
-        img = np.rot90(img, k=rotation_index)
-
-    # Flip
-    flip_index = controls['Flip'].currentIndex()
-    if flip_index == 1:
-        img = cv2.flip(img, 1)  # Horizontal flip
-    elif flip_index == 2:
-        img = cv2.flip(img, 0)  # Vertical flip
+# Snapshot of every value process_image needs. Plain ints/bools only, so it can be
+# hashed, compared and passed to worker threads without touching any widget.
+@dataclass(frozen=True)
+class ProcessingParams:
+    brightness: int = 0
+    contrast: int = 0
+    saturation: int = 0
+    hue: int = 0
+    gamma: int = 10
+    blur: int = 0
+    sharpen: int = 0
+    noise: int = 0
+    edge_detection: int = 0
+    greyscale: bool = False
+    invert: bool = False
+    sepia: bool = False
+    color_balance_red: int = 0
+    color_balance_green: int = 0
+    color_balance_blue: int = 0
+    rotation: int = 0
+    flip: int = 0
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, values):
+        known = cls.__dataclass_fields__
+        return cls(**{key: value for key, value in values.items() if key in known})
+
+    def scaled(self, scale):
+        # Parameters for rendering a copy resized by `scale`. Only the blur radius is
+        # measured in pixels; sharpen and edge detection use fixed 3x3 apertures.
+        if scale == 1.0 or self.blur == 0:
+            return self
+        return replace(self, blur=int(round(self.blur * scale)))
+
+def output_size(shape, params):
+    # (width, height) of process_image's result for an input of the given shape
+    height, width = shape[:2]
+    if params.rotation % 2:
+        return height, width
+    return width, height
+
+def make_proxy(img, max_width, max_height):
+    # Downscaled copy that fits in max_width x max_height, and the scale used
+    height, width = img.shape[:2]
+    scale = min(max_width / width, max_height / height, 1.0)
+    if scale >= 1.0:
+        return img, 1.0
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA), scale
+
+@lru_cache(maxsize=64)
+def gamma_table(gamma):
+    table = ((np.arange(256) / 255.0) ** (1.0 / (gamma / 10.0))) * 255
+    table = table.astype(np.uint8)
+    table.setflags(write=False)
+    return table
+
+# Brightness, contrast and colour balance are all per-channel maps of 0..255, so
+# they are composed into one 256x3 table (optionally followed by gamma) and the
+# image only gets a single cv2.LUT pass. Tables are cached by their parameters.
+@lru_cache(maxsize=64)
+def tone_table(brightness, contrast, blue, green, red, gamma=None):
+    values = np.clip(np.arange(256, dtype=np.float32) + brightness, 0, 255)
+    values = np.clip(np.rint(np.abs(values * np.float32(1 + contrast / 100.0))), 0, 255)
+    table = np.stack([np.clip(values + offset, 0, 255) for offset in (blue, green, red)], axis=-1)
+    table = table.astype(np.uint8)
+    if gamma is not None:
+        table = gamma_table(gamma)[table]
+    table = table.reshape(1, 256, 3)
+    table.setflags(write=False)
+    return table
+
+# Hue shift and saturation scale as one 256x3 table over the uint8 HSV planes
+# (H, S, V), so the stage never needs a float copy of the image.
+@lru_cache(maxsize=64)
+def hue_saturation_table(saturation, hue):
+    values = np.arange(256)
+    hue_plane = (values + hue) % 180
+    saturation_plane = np.minimum(values.astype(np.float32) * np.float32(1 + saturation / 100.0), 255)
+    table = np.stack([hue_plane, saturation_plane, values], axis=-1).astype(np.uint8)
+    table = table.reshape(1, 256, 3)
+    table.setflags(write=False)
+    return table
+
+def tone_is_identity(params):
+    return (params.brightness == 0 and params.contrast == 0 and params.color_balance_blue == 0
+            and params.color_balance_green == 0 and params.color_balance_red == 0)
+
+def fuses_gamma(params):
+    # Gamma can only join the tone table when nothing non-pointwise runs in between
+    return params.saturation == 0 and params.hue == 0 and params.blur == 0 and params.sharpen == 0
+
+# Each stage is (name, key, apply, cacheable). key(params) returns everything the
+# stage reads from params, or None when the stage would leave the image unchanged;
+# apply(img, key) returns the stage output without modifying img.
+
+def tone_key(params):
+    gamma = params.gamma if params.gamma != 10 and fuses_gamma(params) else None
+    if tone_is_identity(params) and gamma is None:
+        return None
+    return (params.brightness, params.contrast, params.color_balance_blue,
+            params.color_balance_green, params.color_balance_red, gamma)
+
+def apply_tone(img, key):
+    return cv2.LUT(img, tone_table(*key))
+
+def apply_hue_saturation(img, key):
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    cv2.LUT(hsv, hue_saturation_table(*key), dst=hsv)
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+def apply_blur(img, blur):
+    return cv2.GaussianBlur(img, (blur * 2 + 1, blur * 2 + 1), 0)
+
+def apply_sharpen(img, sharpen):
+    kernel = np.array([[-1, -1, -1], [-1, 9 + sharpen, -1], [-1, -1, -1]])
+    return cv2.filter2D(img, -1, kernel)
+
+def apply_gamma(img, gamma):
+    return cv2.LUT(img, gamma_table(gamma))
+
+def apply_noise(img, noise):
+    noise = np.random.normal(0, noise, img.shape).astype(np.uint8)
+    return cv2.add(img, noise)
+
+def apply_edge_detection(img, threshold):
+    edges = cv2.Canny(img, threshold, threshold * 2)
+    return cv2.addWeighted(img, 1, cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR), 0.5, 0)
+
+def apply_greyscale(img, _):
+    return cv2.cvtColor(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), cv2.COLOR_GRAY2BGR)
+
+def apply_invert(img, _):
+    return cv2.bitwise_not(img)
+
+def apply_sepia(img, _):
+    sepia_kernel = np.array([[0.272, 0.534, 0.131],
+                             [0.349, 0.686, 0.168],
+                             [0.393, 0.769, 0.189]])
+    return cv2.transform(img, sepia_kernel)
+
+def apply_rotation(img, rotation):
+    return np.rot90(img, k=rotation)
+
+def apply_flip(img, flip):
+    if flip == 1:
+        return cv2.flip(img, 1)  # Horizontal flip
+    return cv2.flip(img, 0)  # Vertical flip
+
+STAGES = [
+    ('tone', tone_key, apply_tone, True),
+    ('hue_saturation', lambda p: (p.saturation, p.hue) if p.saturation or p.hue else None, apply_hue_saturation, True),
+    ('blur', lambda p: p.blur or None, apply_blur, True),
+    ('sharpen', lambda p: p.sharpen or None, apply_sharpen, True),
+    ('gamma', lambda p: p.gamma if p.gamma != 10 and not fuses_gamma(p) else None, apply_gamma, True),
+    ('noise', lambda p: p.noise or None, apply_noise, True),
+    ('edge_detection', lambda p: p.edge_detection or None, apply_edge_detection, True),
+    ('greyscale', lambda p: p.greyscale or None, apply_greyscale, True),
+    ('invert', lambda p: p.invert or None, apply_invert, True),
+    ('sepia', lambda p: p.sepia or None, apply_sepia, True),
+    ('rotation', lambda p: p.rotation or None, apply_rotation, False),  # a view, nothing to save
+    ('flip', lambda p: p.flip or None, apply_flip, True),
+]
+
+def stage_keys(params):
+    return [key(params) for _, key, _, _ in STAGES]
+
+def process_image(img, params, cache=None, cache_key=None):
+    # With a StageCache, every stage output is stored under cache_key (the source
+    # image identity) plus the keys of that stage and all earlier ones, and a
+    # render resumes after the last stage whose output is still cached.
+    keys = stage_keys(params)
+    start = 0
+    if cache is not None:
+        for i in range(len(STAGES) - 1, -1, -1):
+            if keys[i] is None or not STAGES[i][3]:
+                continue
+            cached = cache.get((cache_key, tuple(keys[:i + 1])))
+            if cached is not None:
+                img, start = cached, i + 1
+                break
+
+    for i in range(start, len(STAGES)):
+        if keys[i] is None:
+            continue
+        img = STAGES[i][2](img, keys[i])
+        if cache is not None and STAGES[i][3]:
+            cache.put((cache_key, tuple(keys[:i + 1])), img)
 
     return img
 
+# Qt 5.14 added a BGR pixel format; older Qt gets RGB888 plus a channel swap
+QIMAGE_BGR_FORMAT = getattr(QImage, 'Format_BGR888', None)
+
 def cv_to_qimage(img):
-    height, width, channel = img.shape
-    bytes_per_line = 3 * width
-    qimg = QImage(img.data.tobytes(), width, height, bytes_per_line, QImage.Format_RGB888)
-    return qimg.rgbSwapped()
\ No newline at end of file
+    # QImage that reads the array's own pixels, with no copy when each row is
+    # contiguous (crops and padded rows included); rotated or strided views get
+    # one contiguous copy. The array is kept alive on the QImage, which must not
+    # outlive it in C++ (QPixmap.fromImage and QImage.copy make their own copy).
+    if img.ndim == 2:
+        img_format, pixel_bytes = QImage.Format_Grayscale8, 1
+    else:
+        img_format, pixel_bytes = QIMAGE_BGR_FORMAT or QImage.Format_RGB888, 3
+    if img.dtype != np.uint8 or img.strides[1] != pixel_bytes or (img.ndim == 3 and img.strides[2] != 1) \
+            or img.strides[0] < img.shape[1] * pixel_bytes:
+        img = np.ascontiguousarray(img, dtype=np.uint8)
+    height, width = img.shape[:2]
+    qimg = QImage(sip.voidptr(img.ctypes.data), width, height, img.strides[0], img_format)
+    if img.ndim == 3 and QIMAGE_BGR_FORMAT is None:
+        return qimg.rgbSwapped()
+    qimg.buffer = img
+    return qimg
\ No newline at end of file
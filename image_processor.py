@@ -2,21 +2,56 @@ import cv2, os
 import numpy as np
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QSplitter, QFileDialog, QApplication, QCheckBox, QSlider, QComboBox
 from PyQt5.QtCore import Qt, QPoint, QThreadPool
-from PyQt5.QtGui import QPixmap, QPainter
-from ui_components import create_left_panel, create_right_panel
-from image_processing import process_image, cv_to_qimage
-from ocr_worker import OCRWorker
+from PyQt5.QtGui import QPixmap, QPainter, QIcon
+from ui_components import create_left_panel, create_right_panel, get_processing_params
+from image_processing import ProcessingParams, process_image, cv_to_qimage, output_size
+from ocr_scheduler import OCRScheduler
+from ocr_engines import warm_up_easyocr, OCR_ENGINES, EASYOCR_BATCH_SIZE
+from ocr_cache import OCRCache, cache_path
 from ocr_translation import perform_translation
-from llava_integration import LlavaWorker
+from translation_memory import TranslationMemory
+from llava_integration import LlavaWorker, LlavaQueue
+from ollama_client import warm_up_model
+from llava_cache import LlavaCache
+from llava_payload import PayloadCache, LLAVA_INPUT_SIZE, LLAVA_IMAGE_FORMAT, LLAVA_IMAGE_QUALITY
+from render_scheduler import RenderScheduler
+from stage_cache import StageCache
+from tiled_processing import process_image_tiled, TILED_PROCESSING_PIXELS
+from image_store import ImageStore, ThumbnailWorker
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+# Byte budget for cached intermediate stage outputs across all loaded images
+STAGE_CACHE_BYTES = 1024 * 1024 * 1024
+# Concurrent OCR batches; EasyOCR and Tesseract jobs can then overlap
+OCR_WORKERS = 2
 
 class ImageProcessor(QWidget):
     def __init__(self):
         super().__init__()
         self.initUI()
         self.thread_pool = QThreadPool()
+        self.render_scheduler = RenderScheduler(self)
+        self.render_scheduler.frame_ready.connect(self.on_frame_rendered)
+        self.render_scheduler.render_finished.connect(self.on_render_finished)
+        self.render_scheduler.stats_changed.connect(self.update_render_stats)
         self.image_list.itemSelectionChanged.connect(self.on_selection_changed)
-        self.ocr_in_progress = False
-        self.llava_analysis_in_progress = False
+        self.ocr_cache = OCRCache(disk_path=cache_path('ocr_cache.sqlite3'))
+        # OCR reads the source pixels (only rotated/flipped like the display) through
+        # its own normalisation, rather than the slider-processed render
+        self.ocr_from_source = True
+        self.ocr_scheduler = OCRScheduler(self, workers=OCR_WORKERS, batch_size=EASYOCR_BATCH_SIZE, cache=self.ocr_cache,
+                                          preprocess=self.ocr_from_source)
+        self.ocr_scheduler.result.connect(self.update_ocr_result)
+        self.ocr_scheduler.stats_changed.connect(self.update_ocr_queue_stats)
+        self.translation_memory = TranslationMemory(cache_path('translation_memory.sqlite3'))
+        self.llava_queue = LlavaQueue(self)
+        self.llava_generation = 0
+        self.llava_texts = {}
+        self.llava_payloads = PayloadCache()
+        self.llava_cache = LlavaCache(cache_path('llava_cache.sqlite3'))
+        self.llava_warmed_up = False
+        warm_up_easyocr()
 
     def initUI(self):
         self.setWindowTitle('Advanced Image Processor')
@@ -38,13 +73,23 @@ class ImageProcessor(QWidget):
 
         self.setLayout(main_layout)
 
-        self.images = []
+        self.images = ImageStore()
         self.current_images = []
         self.processed_images = []
+        self.preview_mode = True  # Render sliders from frame-sized proxies
+        self.proxies = {}
+        self.thumbnail_pool = QThreadPool()
+        self.thumbnail_pool.setMaxThreadCount(2)  # Leave the cores to rendering
+        self.thumbnail_workers = []
+        self.thumbnail_generation = 0
+        self.full_res_params = None
+        self.full_res_images = []
+        self.render_params = None
+        self.image_keys = []
+        self.stage_cache = StageCache(STAGE_CACHE_BYTES)
+        self.render_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
         self.current_image_paths = []
-        self.ocr_workers = []
         self.translation_workers = []
-        self.llava_workers = []
 
         # Set initial visibility
         self.set_initial_translation_visibility(False)
@@ -56,25 +101,50 @@ class ImageProcessor(QWidget):
         file_dialog = QFileDialog()
         image_paths, _ = file_dialog.getOpenFileNames(self, "Select Images", "", "Image Files (*.png *.jpg *.jpeg *.bmp)")
         if image_paths:
-            self.images = []  # Clear existing images
+            # Files are only registered here; pixels are decoded when first needed
+            self.images = ImageStore()  # Clear existing images
             self.current_image_paths = []  # Clear existing paths
+            self.image_keys = []
+            self.proxies.clear()
+            self.stage_cache.clear()
+            self.full_res_params = None
             for path in image_paths:
-                img = cv2.imread(path)
-                if img is not None:
-                    self.images.append(img)
+                if self.images.add(path):
+                    self.image_keys.append((path, os.path.getmtime(path)))
                     self.current_image_paths.append(path)
                     self.image_list.addItem(os.path.basename(path))
 
             self.update_images()
+            self.load_thumbnails()
         else:
             print("No images selected")
 
+    def load_thumbnails(self):
+        # List icons come from reduced decodes on the thread pool, in chunks so
+        # the first ones appear quickly. Chunks of an earlier upload stop at their
+        # next thumbnail, and every chunk removes itself from thumbnail_workers
+        # when done.
+        self.thumbnail_generation += 1
+        first = self.image_list.count() - len(self.images)
+        for start in range(0, len(self.images), 16):
+            worker = ThumbnailWorker(self.images, self.thumbnail_generation, range(start, min(start + 16, len(self.images))),
+                                     lambda generation: generation == self.thumbnail_generation)
+            worker.signals.result.connect(lambda generation, index, image, first=first: self.set_thumbnail(generation, first + index, image))
+            worker.signals.finished.connect(lambda w=worker: self.thumbnail_workers.remove(w))
+            self.thumbnail_workers.append(worker)
+            self.thumbnail_pool.start(worker)
+
+    def set_thumbnail(self, generation, row, image):
+        if generation == self.thumbnail_generation and row < self.image_list.count():
+            self.image_list.item(row).setIcon(QIcon(QPixmap.fromImage(image)))
+
     # Make sure this method is correctly updating current_image_paths
     def on_selection_changed(self):
         selected_items = self.image_list.selectedItems()
         selected_indices = [self.image_list.row(item) for item in selected_items]
 
-        self.current_images = [self.images[i] for i in selected_indices if i < len(self.images)]
+        # Indices rather than arrays, so selecting files does not decode them
+        self.current_images = [i for i in selected_indices if i < len(self.images)]
         self.current_image_paths = [self.current_image_paths[i] for i in selected_indices if i < len(self.current_image_paths)]
 
         if self.auto_ocr_checkbox.isChecked():
@@ -89,8 +159,9 @@ class ImageProcessor(QWidget):
         max_width = int(screen.width() * 0.8)
         max_height = int(screen.height() * 0.8)
 
-        image_width = max(img.shape[1] for img in self.images)
-        image_height = max(img.shape[0] for img in self.images)
+        # Sizes from the file headers; nothing is decoded for this
+        image_width = max(self.images.shape(i)[1] for i in range(len(self.images)))
+        image_height = max(self.images.shape(i)[0] for i in range(len(self.images)))
 
         total_width = min(image_width * len(self.images), max_width)
         total_height = min(image_height + 400, max_height)  # 400 for controls and results
@@ -98,15 +169,76 @@ class ImageProcessor(QWidget):
         self.resize(int(total_width), int(total_height))
 
 
+    def proxy_size(self, img_idx):
+        # Pixel size a preview needs to fill its frame, rounded up so small
+        # window resizes reuse the same proxy
+        frame = self.image_frames[min(img_idx, len(self.image_frames) - 1)]
+        ratio = frame.devicePixelRatioF()
+        width = -(-int(frame.width() * ratio) // 256) * 256
+        height = -(-int(frame.height() * ratio) // 256) * 256
+        return width, height
+
+    def render_preview(self, img_idx, images, image_key, params, size):
+        # Runs on the render thread; size comes from proxy_size on the GUI thread.
+        # The proxy comes from a reduced-resolution decode, so the full image is
+        # never decoded just to show it.
+        width, height = size
+        if params.rotation % 2:
+            width, height = height, width
+        cached = self.proxies.get(img_idx)
+        if cached is None or cached[0] != image_key or cached[1] != (width, height):
+            cached = (image_key, (width, height)) + images.preview(img_idx, width, height)
+            self.proxies[img_idx] = cached
+        _, _, proxy, scale = cached
+        cache_key = (image_key, 'preview', proxy.shape)
+        return process_image(proxy, params.scaled(scale), self.stage_cache, cache_key)
+
+    def displayed_indices(self):
+        # Only images with an ImageFrame are rendered; the rest stay in the list
+        return range(min(len(self.images), len(self.image_frames)))
+
+    def get_full_resolution_images(self):
+        # Full-size renders of the displayed images, only made on demand for
+        # saving, OCR and Llava
+        params = get_processing_params(self.controls)
+        indices = self.displayed_indices()
+        if self.full_res_params != params or len(self.full_res_images) != len(indices):
+            self.full_res_images = list(self.render_executor.map(
+                lambda i: self.render_full_resolution(i, params), indices))
+            self.full_res_params = params
+        return self.full_res_images
+
+    def render_full_resolution(self, img_idx, params):
+        img = self.images[img_idx]
+        height, width = self.images.shape(img_idx)[:2]
+        if height * width > TILED_PROCESSING_PIXELS:
+            return process_image_tiled(img, params)
+        return process_image(img, params, self.stage_cache, (self.image_keys[img_idx], 'full'))
+
     def update_images(self):
-        self.processed_images = [process_image(img, self.controls) for img in self.images]
-        
-        for i, frame in enumerate(self.image_frames):
-            if i < len(self.processed_images):
-                frame.set_image(self.processed_images[i])
+        params = get_processing_params(self.controls)
+        if self.full_res_params != params:
+            self.full_res_params, self.full_res_images = None, []
+        self.render_params = params
+        if len(self.processed_images) != len(self.images):
+            self.processed_images = [None] * len(self.images)
+
+        jobs = []
+        for i in self.displayed_indices():
+            if self.preview_mode:
+                jobs.append((i, partial(self.render_preview, i, self.images, self.image_keys[i], params, self.proxy_size(i))))
             else:
-                frame.set_image(None)
+                jobs.append((i, partial(self.render_full_resolution, i, params)))
+        for frame in self.image_frames[len(self.images):]:
+            frame.set_image(None)
+        self.render_scheduler.submit(jobs)
+
+    def on_frame_rendered(self, image_index, image):
+        self.processed_images[image_index] = image
+        if image_index < len(self.image_frames):
+            self.image_frames[image_index].set_image(image, output_size(self.images.shape(image_index), self.render_params))
 
+    def on_render_finished(self):
         # Clear previous results
         for ocr_result, translation_result, llava_result in zip(self.ocr_results, self.translation_results, self.llava_results):
             for result in ocr_result + translation_result:
@@ -122,12 +254,21 @@ class ImageProcessor(QWidget):
 
         self.adjust_window_size()
 
+    def closeEvent(self, event):
+        # Drop queued full-resolution renders; running ones finish on their own
+        self.render_executor.shutdown(wait=False, cancel_futures=True)
+        super().closeEvent(event)
+
+    def update_render_stats(self, renders_per_second, latency_ms, stall_ms):
+        self.controls['Render Stats'].setText(
+            f"Render: {renders_per_second:.0f} fps, {latency_ms:.0f} ms latency, GUI stall {stall_ms:.0f} ms")
+
     def save_image(self):
-        if self.processed_images:
+        if self.images:
             file_dialog = QFileDialog()
             save_path, _ = file_dialog.getSaveFileName(self, "Save Image", "", "Image Files (*.png *.jpg *.bmp)")
             if save_path:
-                cv2.imwrite(save_path, self.processed_images[0])
+                cv2.imwrite(save_path, self.get_full_resolution_images()[0])
 
     def start_selection(self, event, img_idx):
         if event.button() == Qt.LeftButton:
@@ -223,54 +364,51 @@ class ImageProcessor(QWidget):
             self.selections[img_idx].append((start_point, end_point))
 
     def perform_ocr(self):
-        if self.ocr_in_progress:
-            #print("OCR already in progress, skipping...")
-            return
-        self.ocr_in_progress = True
-        #print("Starting perform_ocr method")
-        
-        if not self.processed_images:
+        if not self.images:
             print("No processed images available")
-            self.ocr_in_progress = False
             return
 
         for ocr_result in self.ocr_results:
             for result in ocr_result:
                 result.clear()
 
-        self.ocr_workers.clear()
-
-        for i, img in enumerate(self.processed_images):
+        # Each image is submitted as one request; resubmitting an image
+        # supersedes whatever is still queued for it. Only crop rectangles are
+        # worked out here; decoding and rendering happen on the OCR threads.
+        self.ocr_scheduler.preprocess = self.ocr_from_source
+        params = get_processing_params(self.controls)
+        for i in self.displayed_indices():
+            width, height = output_size(self.images.shape(i), params)
+            regions = []
             selections = self.image_frames[i].get_selections()
             if selections:
                 print(f"Found {len(selections)} selections for image {i}")
                 for selection in selections:
-                    start, end = selection[0], selection[-1]
-                    x1, y1 = min(start.x(), end.x()), min(start.y(), end.y())
-                    x2, y2 = max(start.x(), end.x()), max(start.y(), end.y())
-                    cropped_img = img[y1:y2, x1:x2]
-                    if cropped_img.size > 0:
+                    x1, y1, x2, y2 = selection.bounds()
+                    x1, y1, x2, y2 = max(x1, 0), max(y1, 0), min(x2, width), min(y2, height)
+                    if x2 > x1 and y2 > y1:
                         print(f"Processing selection: ({x1}, {y1}) to ({x2}, {y2})")
-                        for ocr_type in ['EasyOCR', 'Tesseract']:
-                            worker = OCRWorker(cropped_img, ocr_type)
-                            worker.finished.connect(lambda text, ocr_type, idx=i: self.update_ocr_result(text, ocr_type, idx))
-                            worker.start()
-                            self.ocr_workers.append(worker)
+                        regions.append((x1, y1, x2, y2))
             else:
                 print(f"No selections for image {i}, using full image")
-                for ocr_type in ['EasyOCR', 'Tesseract']:
-                    worker = OCRWorker(img, ocr_type)
-                    worker.finished.connect(lambda text, ocr_type, idx=i: self.update_ocr_result(text, ocr_type, idx))
-                    worker.start()
-                    self.ocr_workers.append(worker)
-
-        if not self.ocr_workers:
-            print("No OCR workers created")
-            for i in range(len(self.processed_images)):
+                regions.append(None)
+
+            if regions:
+                visible = not self.image_frames[i].visibleRegion().isEmpty()
+                self.ocr_scheduler.submit(i, partial(self.render_ocr_image, self.images, i, params, self.ocr_from_source),
+                                          regions, OCR_ENGINES, visible)
+            else:
                 self.update_ocr_result("No text detected", "EasyOCR", i)
                 self.update_ocr_result("No text detected", "Tesseract", i)
 
-        self.ocr_in_progress = False
+    def render_ocr_image(self, images, img_idx, params, from_source):
+        # Runs on the OCR prepare thread
+        if from_source:
+            return process_image(images[img_idx], ProcessingParams(rotation=params.rotation, flip=params.flip))
+        return self.render_full_resolution(img_idx, params)
+
+    def update_ocr_queue_stats(self, queued, average_wait_ms):
+        self.controls['OCR Queue Stats'].setText(f"OCR queue: {queued} pending, {average_wait_ms:.0f} ms average wait")
 
     def toggle_control_group(self, group_key, state):
         if group_key in self.controls:
@@ -286,6 +424,10 @@ class ImageProcessor(QWidget):
                 if translation_group:
                     translation_group.setVisible(False)
         elif group_key == 'llava_group':
+            # Load the model on the Ollama server as soon as Llava is shown
+            if state == Qt.Checked and not self.llava_warmed_up:
+                self.llava_warmed_up = True
+                warm_up_model()
             for i in range(3):
                 llava_group = self.results_layout.itemAtPosition(2, i).widget()
                 if llava_group:
@@ -308,7 +450,12 @@ class ImageProcessor(QWidget):
                 print(f"Updated Tesseract result for image {image_index}")
         else:
             print(f"Error: Invalid image index {image_index}")
-        
+
+        stats = self.ocr_cache.stats()
+        self.controls['OCR Cache Stats'].setText(
+            f"OCR cache: {stats['memory_hits'] + stats['disk_hits']} hits "
+            f"({stats['disk_hits']} from disk), {stats['misses']} misses")
+
         # Force update of the GUI
         QApplication.processEvents()
 
@@ -351,56 +498,81 @@ class ImageProcessor(QWidget):
         self.controls['llava_group'].setVisible(state)
 
     def perform_llava_analysis(self):
-        if self.llava_analysis_in_progress:
-            print("Llava Analysis already in progress, skipping...")
-            return
-
-        self.llava_analysis_in_progress = True
         print("Perform Llava Analysis button clicked")
 
-        if not self.processed_images:
+        if not self.images:
             print("No processed images available for Llava analysis")
-            self.llava_analysis_in_progress = False
             return
 
+        # A new analysis replaces whatever is still queued or streaming
+        self.llava_queue.cancel_all()
+        self.llava_generation += 1
+        self.llava_texts = {}
         for llava_result in self.llava_results:
             llava_result.clear()
 
-        self.llava_workers = []  # Clear previous workers
-
-        for i, img in enumerate(self.processed_images):
-            print(f"Processing image {i}, shape: {img.shape}")
+        params = get_processing_params(self.controls)
+        refresh = self.controls['Llava Refresh'].isChecked()
+        started = 0
+        full_res_images = None
+        for i in self.displayed_indices():
+            width, height = output_size(self.images.shape(i), params)
+            print(f"Processing image {i}, size: {width}x{height}")
+            regions = []
             selections = self.image_frames[i].get_selections()
             if selections:
                 print(f"Found {len(selections)} selections for image {i}")
                 for selection in selections:
-                    start, end = selection[0], selection[-1]
-                    x1, y1 = min(start.x(), end.x()), min(start.y(), end.y())
-                    x2, y2 = max(start.x(), end.x()), max(start.y(), end.y())
-                    cropped_img = img[y1:y2, x1:x2]
-                    if cropped_img.size > 0:
+                    x1, y1, x2, y2 = selection.bounds()
+                    x1, y1, x2, y2 = max(x1, 0), max(y1, 0), min(x2, width), min(y2, height)
+                    if x2 > x1 and y2 > y1:
                         print(f"Processing selection: ({x1}, {y1}) to ({x2}, {y2})")
-                        worker = LlavaWorker(cropped_img, i)
-                        worker.signals.result.connect(self.update_llava_result)
-                        self.llava_workers.append(worker)
-                        self.thread_pool.start(worker)
+                        regions.append((x1, y1, x2, y2))
             else:
                 print(f"No selections for image {i}, using full image")
-                worker = LlavaWorker(img, i)
-                worker.signals.result.connect(self.update_llava_result)
-                self.llava_workers.append(worker)
-                self.thread_pool.start(worker)
-
-        print(f"Started {len(self.llava_workers)} Llava analysis workers")
-        self.llava_analysis_in_progress = False
+                regions.append((0, 0, width, height))
+
+            for region, (x1, y1, x2, y2) in enumerate(regions):
+                # Repeating an analysis with unchanged settings reuses the encoded
+                # payload and skips the full resolution render entirely
+                payload_key = (self.image_keys[i], params, (x1, y1, x2, y2),
+                               LLAVA_INPUT_SIZE, LLAVA_IMAGE_FORMAT, LLAVA_IMAGE_QUALITY)
+                payload = self.llava_payloads.get(payload_key)
+                region_img = None
+                if payload is None:
+                    if full_res_images is None:
+                        full_res_images = self.get_full_resolution_images()
+                    region_img = full_res_images[i][y1:y2, x1:x2]
+                worker = LlavaWorker(region_img, i, region, payload=payload,
+                                     payload_key=payload_key, payload_cache=self.llava_payloads,
+                                     result_cache=self.llava_cache, refresh=refresh)
+                generation = self.llava_generation
+                worker.signals.partial.connect(
+                    lambda text, idx, reg, gen=generation: self.update_llava_result(text, idx, reg, gen, is_partial=True))
+                worker.signals.result.connect(
+                    lambda text, idx, reg, gen=generation: self.update_llava_result(text, idx, reg, gen))
+                if self.llava_queue.submit(worker):
+                    started += 1
+
+        print(f"Queued {started} Llava analysis workers ({self.llava_queue.pending()} pending)")
+
+    def update_llava_result(self, result, image_index, region=0, generation=None, is_partial=False):
+        if generation is not None and generation != self.llava_generation:
+            return  # From an analysis that has since been replaced
+        if image_index >= len(self.llava_results):
+            print(f"Error: Invalid image index {image_index}")
+            return
 
-    def update_llava_result(self, result, image_index):
-        print(f"Received Llava result for image {image_index}")
-        if image_index < len(self.llava_results):
+        # Several regions of one image share a pane, each in its own section
+        texts = self.llava_texts.setdefault(image_index, {})
+        texts[region] = result
+        if len(texts) == 1:
             self.llava_results[image_index].setPlainText(result)
-            print(f"Updated Llava result for image {image_index}")
         else:
-            print(f"Error: Invalid image index {image_index}")
+            self.llava_results[image_index].setPlainText('\n\n'.join(
+                f"Region {r + 1}:\n{text}" for r, text in sorted(texts.items())))
 
-        # Force update of the GUI
-        QApplication.processEvents()
\ No newline at end of file
+        if not is_partial:
+            print(f"Updated Llava result for image {image_index}")
+            # Force update of the GUI
+            QApplication.processEvents()
\ No newline at end of file
@@ -0,0 +1,123 @@
+import os
+import threading
+import cv2
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal, pyqtSlot
+from PyQt5.QtGui import QImageReader, QImageIOHandler
+from image_processing import make_proxy, cv_to_qimage
+from stage_cache import StageCache
+
+DECODED_IMAGE_BYTES = 1024 * 1024 * 1024
+THUMBNAIL_SIZE = 64
+# cv2.imread flags that let the decoder scale down while decoding (JPEG DCT
+# scaling), from the largest reduction to the smallest
+REDUCED_DECODES = [(8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)]
+
+def read_image_size(path):
+    # (width, height) from the file header, as cv2.imread will return it (EXIF
+    # rotation applied), or None when Qt cannot read the file
+    reader = QImageReader(path)
+    size = reader.size()
+    if not size.isValid():
+        return None
+    if reader.transformation() & QImageIOHandler.TransformationRotate90:
+        return size.height(), size.width()
+    return size.width(), size.height()
+
+# List of image files that only decodes on access. Files are registered from
+# their header, full-resolution arrays are decoded on first use and kept in a
+# byte-bounded LRU, and previews are decoded at reduced resolution.
+class ImageStore:
+    def __init__(self, max_bytes=DECODED_IMAGE_BYTES):
+        self.paths = []
+        self.sizes = []
+        self.decoded = StageCache(max_bytes)
+        self.decode_locks = {}
+        self.lock = threading.Lock()
+
+    def add(self, path):
+        size = read_image_size(path)
+        if size is None:
+            img = cv2.imread(path)
+            if img is None:
+                return False
+            size = (img.shape[1], img.shape[0])
+            self.decoded.put((path, 1), img)
+        self.paths.append(path)
+        self.sizes.append(size)
+        return True
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __bool__(self):
+        return bool(self.paths)
+
+    def __getitem__(self, index):
+        return self.decode(self.paths[index], 1, cv2.IMREAD_COLOR)
+
+    def shape(self, index):
+        width, height = self.sizes[index]
+        return height, width, 3
+
+    def decode(self, path, factor, flags, cache=True):
+        with self.lock:
+            decode_lock = self.decode_locks.setdefault((path, factor), threading.Lock())
+        # One decode per file and factor at a time; the others wait and take the
+        # cached array
+        with decode_lock:
+            img = self.decoded.get((path, factor))
+            if img is None:
+                img = cv2.imread(path, flags)
+                if img is None:
+                    raise IOError(f"Could not decode {path}")
+                if cache:
+                    self.decoded.put((path, factor), img)
+            return img
+
+    def reduced(self, index, max_width, max_height, cache=True):
+        # Cheapest decode that still covers what make_proxy keeps for
+        # max_width x max_height: the largest reduction that stays above it, or
+        # the full-resolution image
+        width, height = self.sizes[index]
+        scale = min(max_width / width, max_height / height)
+        for factor, flags in REDUCED_DECODES:
+            if factor * scale <= 1.0:
+                return self.decode(self.paths[index], factor, flags, cache)
+        return self[index]
+
+    def preview(self, index, max_width, max_height):
+        # Proxy that fits in max_width x max_height and its scale relative to
+        # the full-resolution image
+        proxy, _ = make_proxy(self.reduced(index, max_width, max_height), max_width, max_height)
+        return proxy, proxy.shape[1] / self.sizes[index][0]
+
+    def thumbnail(self, index, size=THUMBNAIL_SIZE):
+        img = self.reduced(index, size, size, cache=False)
+        return make_proxy(img, size, size)[0]
+
+class ThumbnailSignals(QObject):
+    result = pyqtSignal(int, int, object)  # generation, image index, QImage
+    finished = pyqtSignal()
+
+class ThumbnailWorker(QRunnable):
+    def __init__(self, store, generation, indices, is_current=None):
+        super().__init__()
+        self.store = store
+        self.generation = generation
+        self.indices = indices
+        # Returns False once a newer upload replaced this one; the remaining
+        # thumbnails are then skipped
+        self.is_current = is_current
+        self.signals = ThumbnailSignals()
+
+    @pyqtSlot()
+    def run(self):
+        for index in self.indices:
+            if self.is_current is not None and not self.is_current(self.generation):
+                break
+            try:
+                # QImage is safe off the GUI thread; the pixmap is made by the receiver
+                self.signals.result.emit(self.generation, index, cv_to_qimage(self.store.thumbnail(index)))
+            except Exception as e:
+                print(f"Error loading thumbnail for {os.path.basename(self.store.paths[index])}: {str(e)}")
+        self.signals.finished.emit()
\ No newline at end of file
@@ -0,0 +1,66 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+LLAVA_CACHE_TTL = 30 * 24 * 60 * 60  # seconds
+LLAVA_CACHE_MAX_ENTRIES = 5000
+
+# Llava answers stored in SQLite, keyed by the exact image payload sent plus the
+# prompt, model and generation options. Entries older than ttl are ignored and
+# removed, and once there are more than max_entries the least recently used
+# ones are dropped.
+class LlavaCache:
+    def __init__(self, disk_path, ttl=LLAVA_CACHE_TTL, max_entries=LLAVA_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(disk_path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS llava_results "
+                        "(key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL, used REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS llava_results_used ON llava_results (used)")
+        self.db.commit()
+
+    def key(self, payload, prompt, model, options=None):
+        digest = hashlib.blake2b(payload.encode('ascii'), digest_size=16).hexdigest()
+        description = json.dumps([digest, prompt, model, options or {}], sort_keys=True)
+        return hashlib.blake2b(description.encode(), digest_size=16).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT text FROM llava_results WHERE key = ? AND created > ?",
+                                  (key, now - self.ttl)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE llava_results SET used = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, text):
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO llava_results (key, text, created, used) VALUES (?, ?, ?, ?)",
+                            (key, text, now, now))
+            self.evict(now)
+            self.db.commit()
+
+    def evict(self, now):
+        self.db.execute("DELETE FROM llava_results WHERE created <= ?", (now - self.ttl,))
+        self.db.execute("DELETE FROM llava_results WHERE key IN (SELECT key FROM llava_results "
+                        "ORDER BY used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM llava_results")
+            self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            entries = self.db.execute("SELECT COUNT(*) FROM llava_results").fetchone()[0]
+            return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
\ No newline at end of file
@@ -1,44 +1,117 @@
-from PyQt5.QtCore import QRunnable, pyqtSlot, pyqtSignal, QObject
-import ollama
-import cv2
-import base64
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSlot, pyqtSignal
+import threading
+from ollama_client import stream_analysis, LLAVA_MODEL, LLAVA_PROMPT
+from llava_payload import encode_for_llava
+
+# Ollama answers one request per loaded model at a time unless OLLAMA_NUM_PARALLEL
+# is raised, so more concurrent workers would only wait inside the server
+LLAVA_CONCURRENCY = 1
+LLAVA_MAX_QUEUED = 16
 
 class WorkerSignals(QObject):
-    result = pyqtSignal(str, int)
+    result = pyqtSignal(str, int, int)  # full text, image index, region
+    partial = pyqtSignal(str, int, int)  # text so far, image index, region
+    finished = pyqtSignal()
 
 class LlavaWorker(QRunnable):
-    def __init__(self, image_data, image_index):
+    def __init__(self, image_data, image_index, region=0, model=LLAVA_MODEL, prompt=LLAVA_PROMPT, host=None,
+                 payload=None, payload_key=None, payload_cache=None, options=None, result_cache=None, refresh=False):
         super().__init__()
+        # image_data may be None when an already encoded payload is given
         self.image_data = image_data
+        self.payload = payload
+        self.payload_key = payload_key
+        self.payload_cache = payload_cache
+        self.options = options
+        # With refresh set the cached answer is ignored, and replaced by the new one
+        self.result_cache = result_cache
+        self.refresh = refresh
         self.image_index = image_index
+        self.region = region
+        self.model = model
+        self.prompt = prompt
+        self.host = host
+        self.cancelled = threading.Event()
         self.signals = WorkerSignals()
 
+    def cancel(self):
+        self.cancelled.set()
+
     @pyqtSlot()
     def run(self):
         try:
+            if self.cancelled.is_set():
+                return
             print(f"LlavaWorker: Starting analysis for image {self.image_index}")
-            
-            # Convert image data to base64
-            _, buffer = cv2.imencode('.png', self.image_data)
-            base64_image = base64.b64encode(buffer).decode('utf-8')
-
-            print(f"LlavaWorker: Calling ollama.chat for image {self.image_index}")
-            res = ollama.chat(
-                model="llava-llama3",
-                messages=[
-                    {
-                        'role': 'user',
-                        'content': 'Describe the image: I want the data presented in this way: Name, HP, Card number',
-                        'images': [base64_image]
-                    }
-                ]
-            )
-            content = res['message']['content']
+
+            base64_image = self.payload
+            if base64_image is None:
+                base64_image, encode_ms = encode_for_llava(self.image_data)
+                if self.payload_cache is not None and self.payload_key is not None:
+                    self.payload_cache.put(self.payload_key, base64_image)
+                print(f"LlavaWorker: Encoded image {self.image_index} in {encode_ms:.1f} ms")
+            else:
+                print(f"LlavaWorker: Reusing encoded payload for image {self.image_index}")
+
+            cache_key = None
+            if self.result_cache is not None:
+                cache_key = self.result_cache.key(base64_image, self.prompt, self.model, self.options)
+                cached = None if self.refresh else self.result_cache.get(cache_key)
+                if cached is not None:
+                    print(f"LlavaWorker: Using cached answer for image {self.image_index}")
+                    self.signals.result.emit(cached, self.image_index, self.region)
+                    return
+
+            print(f"LlavaWorker: Sending {len(base64_image) / 1024:.1f} KB for image {self.image_index}")
+            print(f"LlavaWorker: Streaming {self.model} answer for image {self.image_index}")
+            content = ''
+            for chunk in stream_analysis(base64_image, self.model, self.prompt, self.host, self.options,
+                                         cancelled=self.cancelled.is_set):
+                content += chunk
+                self.signals.partial.emit(content, self.image_index, self.region)
+            if self.cancelled.is_set():
+                print(f"LlavaWorker: Analysis for image {self.image_index} cancelled")
+                return
             print(f"LlavaWorker: Analysis completed for image {self.image_index}")
+            if cache_key is not None and content:
+                self.result_cache.put(cache_key, content)
             print(f"LlavaWorker: Result: {content[:100]}...")  # Print first 100 characters of the result
-            self.signals.result.emit(content, self.image_index)
+            self.signals.result.emit(content, self.image_index, self.region)
         except Exception as e:
             error_message = f"Error in Llava analysis for image {self.image_index}: {str(e)}"
             print(f"LlavaWorker: {error_message}")
-            self.signals.result.emit(error_message, self.image_index)
-        print(f"LlavaWorker: Task for image {self.image_index} finished")
\ No newline at end of file
+            self.signals.result.emit(error_message, self.image_index, self.region)
+        finally:
+            print(f"LlavaWorker: Task for image {self.image_index} finished")
+            self.signals.finished.emit()
+
+# Bounded queue in front of the Ollama server: at most LLAVA_CONCURRENCY requests
+# run at once and at most max_queued wait. cancel_all() drops waiting requests
+# and stops streaming ones.
+class LlavaQueue(QObject):
+    def __init__(self, parent=None, concurrency=LLAVA_CONCURRENCY, max_queued=LLAVA_MAX_QUEUED):
+        super().__init__(parent)
+        self.max_queued = max_queued
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(concurrency)
+        self.workers = []
+
+    def submit(self, worker):
+        if len(self.workers) >= self.thread_pool.maxThreadCount() + self.max_queued:
+            worker.signals.result.emit("Llava queue is full, try again later", worker.image_index, worker.region)
+            return False
+        worker.signals.finished.connect(lambda w=worker: self.on_finished(w))
+        self.workers.append(worker)
+        self.thread_pool.start(worker)
+        return True
+
+    def on_finished(self, worker):
+        if worker in self.workers:
+            self.workers.remove(worker)
+
+    def cancel_all(self):
+        for worker in self.workers:
+            worker.cancel()
+
+    def pending(self):
+        return len(self.workers)
\ No newline at end of file
@@ -0,0 +1,71 @@
+import base64
+import threading
+import time
+from collections import OrderedDict
+import cv2
+
+# The vision encoder of llava-llama3 works on 336x336 inputs (up to 672 px for
+# llava 1.6 tiling), so anything larger is only downsampled again by the server
+LLAVA_INPUT_SIZE = 672
+# '.png' keeps the payload lossless; '.jpg' and '.webp' are several times smaller
+LLAVA_IMAGE_FORMAT = '.jpg'
+LLAVA_IMAGE_QUALITY = 90
+LLAVA_PAYLOAD_CACHE_BYTES = 64 * 1024 * 1024
+
+def encode_params(image_format, quality):
+    if image_format == '.jpg':
+        return [cv2.IMWRITE_JPEG_QUALITY, quality]
+    if image_format == '.webp':
+        return [cv2.IMWRITE_WEBP_QUALITY, quality]
+    return []
+
+def resize_for_model(img, max_side=LLAVA_INPUT_SIZE):
+    height, width = img.shape[:2]
+    if not max_side or max(height, width) <= max_side:
+        return img
+    scale = max_side / max(height, width)
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+def encode_for_llava(img, max_side=LLAVA_INPUT_SIZE, image_format=LLAVA_IMAGE_FORMAT, quality=LLAVA_IMAGE_QUALITY):
+    # Returns the base64 payload and the time the resize and encode took, in ms
+    started = time.perf_counter()
+    ok, buffer = cv2.imencode(image_format, resize_for_model(img, max_side), encode_params(image_format, quality))
+    if not ok:
+        raise ValueError(f"Could not encode image as {image_format}")
+    payload = base64.b64encode(buffer).decode('ascii')
+    return payload, (time.perf_counter() - started) * 1000
+
+# Base64 payloads of earlier analyses, keyed by source image, region, processing
+# parameters and encode settings, so repeating an analysis skips the encode
+class PayloadCache:
+    def __init__(self, max_bytes=LLAVA_PAYLOAD_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            payload = self.entries.get(key)
+            if payload is not None:
+                self.entries.move_to_end(key)
+            return payload
+
+    def put(self, key, payload):
+        if len(payload) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous)
+            self.entries[key] = payload
+            self.total_bytes += len(payload)
+            while self.total_bytes > self.max_bytes and self.entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
\ No newline at end of file
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+OCR_CACHE_TTL = 30 * 24 * 60 * 60  # seconds
+OCR_CACHE_MAX_ENTRIES = 20000  # Rows kept in the SQLite tier
+
+def cache_path(filename):
+    # Location for persistent caches; IMAGE_EDITOR_CACHE_DIR overrides the default
+    directory = os.environ.get('IMAGE_EDITOR_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'image-editor')
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, filename)
+
+def image_digest(image):
+    # Content hash of the pixels plus shape and dtype; crops are views, so they
+    # are made contiguous first
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.shape}{image.dtype.str}".encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+# OCR text keyed by crop pixels plus engine, languages and engine settings. The
+# in-memory LRU tier is always on; the SQLite tier is used when disk_path is
+# given and survives restarts. Like LlavaCache, disk entries older than disk_ttl
+# are removed and only the disk_max_entries most recently used ones are kept.
+class OCRCache:
+    def __init__(self, max_entries=2048, disk_path=None, disk_ttl=OCR_CACHE_TTL, disk_max_entries=OCR_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.disk_ttl = disk_ttl
+        self.disk_max_entries = disk_max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.db = None
+        if disk_path:
+            self.db = sqlite3.connect(disk_path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS ocr_results "
+                            "(key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL, used REAL NOT NULL)")
+            columns = [row[1] for row in self.db.execute("PRAGMA table_info(ocr_results)")]
+            if 'used' not in columns:
+                # Caches written before eviction existed
+                self.db.execute("ALTER TABLE ocr_results ADD COLUMN used REAL NOT NULL DEFAULT 0")
+                self.db.execute("UPDATE ocr_results SET used = created")
+            self.db.execute("CREATE INDEX IF NOT EXISTS ocr_results_used ON ocr_results (used)")
+            self.evict(time.time())
+            self.db.commit()
+
+    def key(self, image, ocr_type, languages, settings=None, digest=None):
+        digest = digest or image_digest(image)
+        description = json.dumps([digest, ocr_type, sorted(languages), settings or {}], sort_keys=True)
+        return hashlib.blake2b(description.encode(), digest_size=16).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            text = self.entries.get(key)
+            if text is not None:
+                self.entries.move_to_end(key)
+                self.memory_hits += 1
+                return text
+            if self.db is not None:
+                now = time.time()
+                row = self.db.execute("SELECT text FROM ocr_results WHERE key = ? AND created > ?",
+                                      (key, now - self.disk_ttl)).fetchone()
+                if row is not None:
+                    self.db.execute("UPDATE ocr_results SET used = ? WHERE key = ?", (now, key))
+                    self.db.commit()
+                    self.disk_hits += 1
+                    self.remember(key, row[0])
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, text):
+        with self.lock:
+            self.remember(key, text)
+            if self.db is not None:
+                now = time.time()
+                self.db.execute("INSERT OR REPLACE INTO ocr_results (key, text, created, used) VALUES (?, ?, ?, ?)",
+                                (key, text, now, now))
+                self.evict(now)
+                self.db.commit()
+
+    def evict(self, now):
+        self.db.execute("DELETE FROM ocr_results WHERE created <= ?", (now - self.disk_ttl,))
+        self.db.execute("DELETE FROM ocr_results WHERE key IN (SELECT key FROM ocr_results "
+                        "ORDER BY used DESC LIMIT -1 OFFSET ?)", (self.disk_max_entries,))
+
+    def remember(self, key, text):
+        self.entries[key] = text
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM ocr_results")
+                self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            return {'memory_hits': self.memory_hits, 'disk_hits': self.disk_hits,
+                    'misses': self.misses, 'entries': len(self.entries)}
\ No newline at end of file
@@ -0,0 +1,241 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import cv2
+import numpy as np
+import easyocr
+import torch
+from ocr_preprocessing import prepare_for_ocr, PREPROCESSING
+
+OCR_ENGINES = ('EasyOCR', 'Tesseract')
+# Crops per detection forward pass, and text boxes per recognition batch
+EASYOCR_BATCH_SIZE = 8
+# Larger images are searched for text on a copy downscaled to this size and only
+# the detected boxes are recognised at full resolution
+EASYOCR_DETECT_MAX_SIDE = 1600
+# A crop is only padded into a batch when its area is at least 1/PAD_AREA_RATIO
+# of the largest crop in that batch
+PAD_AREA_RATIO = 4
+
+# Loaded EasyOCR models, keyed by (languages, device). Loading the detection and
+# recognition networks takes seconds, so each reader is built once and shared by
+# every OCR job for the lifetime of the process.
+_easyocr_readers = {}
+_easyocr_registry_lock = threading.Lock()
+
+def easyocr_device(gpu=True):
+    return 'cuda' if gpu and torch.cuda.is_available() else 'cpu'
+
+class SharedEasyOCRReader:
+    def __init__(self, languages, device):
+        self.languages = languages
+        self.device = device
+        print(f"Loading EasyOCR reader for {', '.join(languages)} on {device}")
+        self.reader = easyocr.Reader(list(languages), gpu=(device != 'cpu'))
+        # One inference at a time per model; jobs on other readers are not blocked
+        self.lock = threading.Lock()
+
+    def readtext(self, image, **kwargs):
+        with self.lock:
+            return self.reader.readtext(image, **kwargs)
+
+    def readtext_batched(self, images, batch_size=EASYOCR_BATCH_SIZE, **kwargs):
+        # EasyOCR's batched path needs equally sized inputs. Crops are padded to
+        # the largest one in each batch rather than resized, so text keeps its scale.
+        results = [None] * len(images)
+        small = []
+        for i, image in enumerate(images):
+            if max(image.shape[:2]) > EASYOCR_DETECT_MAX_SIDE:
+                results[i] = self.readtext_downscaled_detection(image, batch_size, **kwargs)
+            else:
+                small.append(i)
+        # Chunks are formed from similarly sized crops, so a small selection is
+        # never padded up to a whole image; results[i] keeps the original order
+        small.sort(key=lambda i: images[i].shape[:2])
+        for start in range(0, len(small), batch_size):
+            chunk = small[start:start + batch_size]
+            height = max(images[i].shape[0] for i in chunk)
+            width = max(images[i].shape[1] for i in chunk)
+            # Crops still far smaller than the rest of their chunk are cheaper on their own
+            for i in [i for i in chunk if images[i].shape[0] * images[i].shape[1] * PAD_AREA_RATIO < height * width]:
+                chunk.remove(i)
+                with self.lock:
+                    results[i] = self.reader.readtext(images[i], batch_size=batch_size, **kwargs)
+            if not chunk:
+                continue
+            height = max(images[i].shape[0] for i in chunk)
+            width = max(images[i].shape[1] for i in chunk)
+            padded = [pad_to_size(images[i], height, width) for i in chunk]
+            with self.lock:
+                batch_results = self.reader.readtext_batched(padded, batch_size=batch_size, **kwargs)
+            for i, result in zip(chunk, batch_results):
+                results[i] = result
+        return results
+
+    def readtext_downscaled_detection(self, image, batch_size=EASYOCR_BATCH_SIZE, **kwargs):
+        scale = EASYOCR_DETECT_MAX_SIDE / max(image.shape[:2])
+        small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        with self.lock:
+            horizontal_lists, free_lists = self.reader.detect(small)
+            # horizontal boxes are [x_min, x_max, y_min, y_max], free boxes are 4 corner points
+            horizontal_list = [[int(round(v / scale)) for v in box] for box in horizontal_lists[0]]
+            free_list = [[[int(round(x / scale)), int(round(y / scale))] for x, y in box] for box in free_lists[0]]
+            if not horizontal_list and not free_list:
+                return []
+            return self.reader.recognize(image, horizontal_list, free_list, batch_size=batch_size, **kwargs)
+
+def pad_to_size(image, height, width):
+    if image.shape[:2] == (height, width):
+        return image
+    # Fill with the average border colour so the padding doesn't add edges
+    border = np.concatenate([image[0], image[-1], image[:, 0], image[:, -1]])
+    fill = [float(v) for v in np.atleast_1d(border.mean(axis=0))]
+    return cv2.copyMakeBorder(image, 0, height - image.shape[0], 0, width - image.shape[1],
+                              cv2.BORDER_CONSTANT, value=fill)
+
+def get_easyocr_reader(languages=('en',), gpu=True):
+    key = (tuple(sorted(languages)), easyocr_device(gpu))
+    with _easyocr_registry_lock:
+        reader = _easyocr_readers.get(key)
+        if reader is None:
+            reader = SharedEasyOCRReader(*key)
+            _easyocr_readers[key] = reader
+        return reader
+
+def warm_up_easyocr(languages=('en',), gpu=True):
+    # Load the reader in the background so the first OCR request doesn't pay for it
+    def load():
+        try:
+            get_easyocr_reader(languages, gpu)
+        except Exception as e:
+            print(f"Error warming up EasyOCR: {str(e)}")
+
+    thread = threading.Thread(target=load, name='easyocr-warmup', daemon=True)
+    thread.start()
+    return thread
+
+# Where Tesseract usually lives when it isn't on PATH
+TESSERACT_PATHS = {
+    'win32': [r'C:\Program Files\Tesseract-OCR\tesseract.exe', r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe'],
+    'darwin': ['/opt/homebrew/bin/tesseract', '/usr/local/bin/tesseract'],
+    'linux': ['/usr/bin/tesseract', '/usr/local/bin/tesseract'],
+}
+
+# EasyOCR language codes to Tesseract traineddata names
+TESSERACT_LANGUAGES = {'en': 'eng', 'es': 'spa', 'fr': 'fra', 'de': 'deu', 'it': 'ita',
+                       'ja': 'jpn', 'ko': 'kor', 'ch_sim': 'chi_sim', 'ch_tra': 'chi_tra'}
+
+def find_tesseract():
+    # TESSERACT_CMD wins, then PATH, then the platform's usual install locations
+    if os.environ.get('TESSERACT_CMD'):
+        return os.environ['TESSERACT_CMD']
+    found = shutil.which('tesseract')
+    if found:
+        return found
+    for path in TESSERACT_PATHS.get(sys.platform, []):
+        if os.path.exists(path):
+            return path
+    return 'tesseract'
+
+def tesseract_language(languages):
+    return '+'.join(TESSERACT_LANGUAGES.get(language, language) for language in sorted(languages))
+
+# Runs the tesseract CLI directly. A single image goes in through stdin and the
+# text comes back on stdout, so nothing touches the disk; a batch is OCR'd by
+# one process from a list file, so small crops don't each pay for start-up.
+class TesseractEngine:
+    def __init__(self, cmd=None, lang='eng', psm=None, threads=1, timeout=120):
+        self.cmd = cmd or find_tesseract()
+        self.lang = lang
+        self.psm = psm
+        self.threads = threads
+        self.timeout = timeout
+
+    def settings(self):
+        return {'lang': self.lang, 'psm': self.psm}
+
+    def run(self, source, stdin=None):
+        command = [self.cmd, source, 'stdout', '-l', self.lang]
+        if self.psm is not None:
+            command += ['--psm', str(self.psm)]
+        # Tesseract's OpenMP threads fight with our own worker threads
+        env = dict(os.environ, OMP_THREAD_LIMIT=str(self.threads))
+        flags = subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
+        completed = subprocess.run(command, input=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   env=env, timeout=self.timeout, creationflags=flags)
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.decode('utf-8', 'replace').strip() or
+                               f"tesseract exited with code {completed.returncode}")
+        return completed.stdout.decode('utf-8', 'replace')
+
+    def recognize(self, image):
+        # Uncompressed PNM is the cheapest format for leptonica to read
+        ok, buffer = cv2.imencode('.pgm' if image.ndim == 2 else '.ppm', image)
+        if not ok:
+            raise ValueError("Could not encode image for Tesseract")
+        return self.run('stdin', buffer.tobytes()).strip('\f').strip()
+
+    def recognize_many(self, images):
+        if len(images) == 1:
+            return [self.recognize(images[0])]
+        with tempfile.TemporaryDirectory(prefix='tesseract-') as directory:
+            paths = []
+            for i, image in enumerate(images):
+                path = os.path.join(directory, f"{i}.{'pgm' if image.ndim == 2 else 'ppm'}")
+                cv2.imwrite(path, image)
+                paths.append(path)
+            list_path = os.path.join(directory, 'images.txt')
+            with open(list_path, 'w') as list_file:
+                list_file.write('\n'.join(paths) + '\n')
+            # Pages come back in list order, each followed by a form feed
+            pages = self.run(list_path).split('\f')
+        if len(pages) < len(images):
+            return [self.recognize(image) for image in images]
+        return [page.strip() for page in pages[:len(images)]]
+
+def engine_settings(ocr_type, languages, preprocess=False):
+    # Everything besides the pixels that can change an engine's output
+    if ocr_type == 'EasyOCR':
+        settings = {'languages': sorted(languages), 'detail': 0, 'detect_max_side': EASYOCR_DETECT_MAX_SIDE}
+    else:
+        settings = TesseractEngine(lang=tesseract_language(languages)).settings()
+    if preprocess:
+        settings['preprocessing'] = PREPROCESSING[ocr_type]
+    return settings
+
+def recognize_batch(images, ocr_type, languages=('en',), batch_size=EASYOCR_BATCH_SIZE, cache=None, digests=None,
+                    preprocess=False):
+    # Text for each image, in order, using a single engine. With an OCRCache only
+    # the images it hasn't seen before are sent to the engine; digests can carry
+    # already computed image_digest values. preprocess runs prepare_for_ocr on
+    # each image first.
+    keys = [None] * len(images)
+    texts = [None] * len(images)
+    if cache is not None:
+        settings = engine_settings(ocr_type, languages, preprocess)
+        for i, image in enumerate(images):
+            keys[i] = cache.key(image, ocr_type, languages, settings, digests[i] if digests else None)
+            texts[i] = cache.get(keys[i])
+    missing = [i for i, text in enumerate(texts) if text is None]
+    if not missing:
+        return texts
+
+    pending = [images[i] for i in missing]
+    if preprocess:
+        pending = [prepare_for_ocr(image, ocr_type) for image in pending]
+    if ocr_type == 'EasyOCR':
+        reader = get_easyocr_reader(languages)
+        results = ['\n'.join(lines) for lines in reader.readtext_batched(pending, batch_size=batch_size, detail=0)]
+    elif ocr_type == 'Tesseract':
+        results = TesseractEngine(lang=tesseract_language(languages)).recognize_many(pending)
+    else:
+        raise ValueError(f"Unknown OCR engine: {ocr_type}")
+
+    for i, text in zip(missing, results):
+        texts[i] = text
+        if cache is not None:
+            cache.put(keys[i], text)
+    return texts
\ No newline at end of file
@@ -0,0 +1,95 @@
+import cv2
+import numpy as np
+
+# Per-engine normalisation. text_height is the median glyph height (in pixels)
+# each engine reads best at; Tesseract also gets an adaptive binarisation.
+PREPROCESSING = {
+    'EasyOCR': {'text_height': 28, 'binarize': False, 'deskew': True},
+    'Tesseract': {'text_height': 28, 'binarize': True, 'deskew': True},
+}
+
+# Don't rescale when the text is already within this factor of the target
+RESCALE_TOLERANCE = 1.25
+MIN_SCALE = 0.2
+MAX_SCALE = 4.0
+# Upscaling small text never grows an image past this many pixels
+MAX_UPSCALED_PIXELS = 16 * 1000 * 1000
+# Skew angles outside this range are more likely layout than a tilted scan
+MAX_DESKEW_DEGREES = 15.0
+
+def to_grayscale(img):
+    if img.ndim == 2:
+        return img
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+def text_mask(gray):
+    # Otsu threshold, flipped if needed so the (minority) text pixels are white
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if cv2.countNonZero(mask) > mask.size // 2:
+        mask = cv2.bitwise_not(mask)
+    return mask
+
+def estimate_text_height(mask):
+    # Median height of glyph-sized connected components, or None if there are too few
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    glyphs = (heights >= 4) & (areas >= 8) & (widths < mask.shape[1] // 2) & (heights < mask.shape[0] // 2)
+    if np.count_nonzero(glyphs) < 3:
+        return None
+    return float(np.median(heights[glyphs]))
+
+def rescale_to_text_height(gray, text_height, target):
+    scale = min(max(target / text_height, MIN_SCALE), MAX_SCALE)
+    if scale > 1:
+        scale = max(1.0, min(scale, (MAX_UPSCALED_PIXELS / gray.size) ** 0.5))
+    if 1 / RESCALE_TOLERANCE <= scale <= RESCALE_TOLERANCE:
+        return gray, 1.0
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    size = (max(1, int(round(gray.shape[1] * scale))), max(1, int(round(gray.shape[0] * scale))))
+    return cv2.resize(gray, size, interpolation=interpolation), scale
+
+def estimate_skew(mask):
+    points = cv2.findNonZero(mask)
+    if points is None or len(points) < 50:
+        return 0.0
+    angle = cv2.minAreaRect(points)[2]
+    # minAreaRect reports angles in different ranges across OpenCV versions
+    if angle > 45:
+        angle -= 90
+    elif angle < -45:
+        angle += 90
+    return angle if abs(angle) <= MAX_DESKEW_DEGREES else 0.0
+
+def deskew(gray, angle):
+    if abs(angle) < 0.5:
+        return gray
+    height, width = gray.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (width, height), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+def binarize(gray, text_height=None):
+    # Block size a few glyphs wide so uneven lighting is followed but strokes aren't
+    block = int(text_height * 2) if text_height else 31
+    block = max(15, block | 1)
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block, 10)
+
+def prepare_for_ocr(img, ocr_type):
+    # Grayscale, rescale to the engine's preferred text size, deskew and, for
+    # engines that want it, binarise. Fewer pixels reach the models when text
+    # is larger than needed.
+    settings = PREPROCESSING[ocr_type]
+    gray = to_grayscale(img)
+    mask = text_mask(gray)
+    text_height = estimate_text_height(mask)
+    if text_height is not None:
+        gray, scale = rescale_to_text_height(gray, text_height, settings['text_height'])
+        if scale != 1.0:
+            mask = text_mask(gray)
+            text_height *= scale
+    if settings['deskew']:
+        gray = deskew(gray, estimate_skew(mask))
+    if settings['binarize']:
+        gray = binarize(gray, text_height)
+    return gray
\ No newline at end of file
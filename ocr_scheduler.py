@@ -0,0 +1,218 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+from ocr_cache import image_digest
+from ocr_engines import recognize_batch, EASYOCR_BATCH_SIZE
+
+VISIBLE_PRIORITY = 0
+HIDDEN_PRIORITY = 1
+
+# One crop through one engine. Identical crops submitted while the first is still
+# queued share a job; each requester is a waiter (image index, generation, slot).
+class OCRJob:
+    def __init__(self, ocr_type, image, digest, priority):
+        self.ocr_type = ocr_type
+        self.image = image
+        self.digest = digest
+        self.priority = priority
+        self.waiters = []
+        self.submitted_at = time.perf_counter()
+
+class OCRSignals(QObject):
+    done = pyqtSignal(object, object)  # jobs, texts
+    failed = pyqtSignal(int, int, object, str)  # image index, generation, ocr types, message
+    queued = pyqtSignal()
+
+class OCRRunnable(QRunnable):
+    def __init__(self, scheduler):
+        super().__init__()
+        self.scheduler = scheduler
+
+    @pyqtSlot()
+    def run(self):
+        # Keep draining batches until the queue is empty
+        while True:
+            batch = self.scheduler.take_batch()
+            if not batch:
+                break
+            ocr_type = batch[0].ocr_type
+            try:
+                texts = recognize_batch([job.image for job in batch], ocr_type, self.scheduler.languages,
+                                        self.scheduler.batch_size, self.scheduler.cache,
+                                        [job.digest for job in batch], self.scheduler.preprocess)
+            except Exception as e:
+                print(f"Error in OCR {ocr_type}: {str(e)}")
+                texts = [f"Error: {str(e)}"] * len(batch)
+            self.scheduler.signals.done.emit(batch, texts)
+
+class OCRPrepareRunnable(QRunnable):
+    def __init__(self, scheduler, image_index, generation, load, regions, ocr_types, priority):
+        super().__init__()
+        self.scheduler = scheduler
+        self.image_index = image_index
+        self.generation = generation
+        self.load = load
+        self.regions = regions
+        self.ocr_types = ocr_types
+        self.priority = priority
+
+    @pyqtSlot()
+    def run(self):
+        # Decode/render and crop off the GUI thread, unless a newer request for
+        # the same image already replaced this one
+        if not self.scheduler.is_current(self.image_index, self.generation):
+            return
+        try:
+            img = self.load()
+            images = []
+            for region in self.regions:
+                if region is None:
+                    images.append(img)
+                else:
+                    x1, y1, x2, y2 = region
+                    images.append(img[y1:y2, x1:x2])
+            self.scheduler.enqueue(self.image_index, self.generation, images, self.ocr_types, self.priority)
+        except Exception as e:
+            print(f"Error preparing OCR for image {self.image_index}: {str(e)}")
+            self.scheduler.signals.failed.emit(self.image_index, self.generation, self.ocr_types, f"Error: {str(e)}")
+
+# Fixed-size OCR worker pool fed from a priority queue. Crops of visible images
+# go first, identical pending crops are merged, and submitting an image again
+# supersedes its older jobs so stale renders never overwrite newer results.
+class OCRScheduler(QObject):
+    result = pyqtSignal(str, str, int)  # text, ocr type, image index
+    stats_changed = pyqtSignal(int, float)  # queued jobs, average wait in ms
+
+    def __init__(self, parent=None, workers=2, languages=('en',), batch_size=EASYOCR_BATCH_SIZE, cache=None,
+                 preprocess=False):
+        super().__init__(parent)
+        self.workers = workers
+        self.languages = languages
+        self.batch_size = batch_size
+        self.cache = cache
+        self.preprocess = preprocess
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(workers)
+        # Decoding and cropping get their own thread, so they never wait behind OCR
+        self.prepare_pool = QThreadPool(self)
+        self.prepare_pool.setMaxThreadCount(1)
+        self.lock = threading.Lock()
+        self.queue = []
+        self.sequence = itertools.count()
+        self.pending_jobs = {}  # (ocr type, digest) -> queued job
+        self.running = 0
+        self.generations = {}  # image index -> latest generation
+        self.partial_results = {}  # (image index, generation, ocr type) -> list of texts
+        self.waits_ms = deque(maxlen=50)
+        self.signals = OCRSignals()
+        self.signals.done.connect(self.on_done)
+        self.signals.failed.connect(self.on_failed)
+        self.signals.queued.connect(self.emit_stats)
+
+    def submit(self, image_index, load, regions, ocr_types, visible=True):
+        # Queue one request for an image: load() returns the image and runs on a
+        # worker thread, regions are (x1, y1, x2, y2) crops of it or None for the
+        # whole image. Results are emitted once per engine when all crops for
+        # that engine are done.
+        priority = VISIBLE_PRIORITY if visible else HIDDEN_PRIORITY
+        with self.lock:
+            generation = self.generations.get(image_index, 0) + 1
+            self.generations[image_index] = generation
+            self.drop_stale_waiters(image_index, generation)
+        self.prepare_pool.start(OCRPrepareRunnable(self, image_index, generation, load, regions, ocr_types, priority))
+        self.emit_stats()
+
+    def is_current(self, image_index, generation):
+        with self.lock:
+            return self.generations.get(image_index) == generation
+
+    def enqueue(self, image_index, generation, images, ocr_types, priority):
+        # Called from the prepare thread with the cropped images
+        digests = [image_digest(image) for image in images]
+        with self.lock:
+            if self.generations.get(image_index) != generation:
+                return  # Superseded while loading
+            for ocr_type in ocr_types:
+                self.partial_results[(image_index, generation, ocr_type)] = [None] * len(images)
+                for slot, (image, digest) in enumerate(zip(images, digests)):
+                    job = self.pending_jobs.get((ocr_type, digest))
+                    if job is None:
+                        job = OCRJob(ocr_type, image, digest, priority)
+                        self.pending_jobs[(ocr_type, digest)] = job
+                        heapq.heappush(self.queue, (priority, next(self.sequence), job))
+                    elif priority < job.priority:
+                        # Promote a merged job; the old heap entry is skipped when popped
+                        job.priority = priority
+                        heapq.heappush(self.queue, (priority, next(self.sequence), job))
+                    job.waiters.append((image_index, generation, slot))
+            workers_needed = min(self.workers - self.running, len(self.pending_jobs))
+            self.running += max(0, workers_needed)
+        for _ in range(workers_needed):
+            self.thread_pool.start(OCRRunnable(self))
+        self.signals.queued.emit()
+
+    def on_failed(self, image_index, generation, ocr_types, message):
+        if self.is_current(image_index, generation):
+            for ocr_type in ocr_types:
+                self.result.emit(message, ocr_type, image_index)
+
+    def drop_stale_waiters(self, image_index, generation):
+        for key in [key for key in self.partial_results if key[0] == image_index and key[1] < generation]:
+            del self.partial_results[key]
+        for job_key, job in list(self.pending_jobs.items()):
+            job.waiters = [w for w in job.waiters if w[0] != image_index or w[1] >= generation]
+            if not job.waiters:
+                del self.pending_jobs[job_key]  # Cancelled; skipped when popped
+
+    def take_batch(self):
+        # Called from pool threads: the highest-priority job plus up to batch_size - 1
+        # more for the same engine
+        with self.lock:
+            batch, skipped = [], []
+            while self.queue and len(batch) < self.batch_size:
+                entry = heapq.heappop(self.queue)
+                job = entry[2]
+                if self.pending_jobs.get((job.ocr_type, job.digest)) is not job:
+                    continue  # Cancelled, already taken, or a stale priority entry
+                if batch and job.ocr_type != batch[0].ocr_type:
+                    skipped.append(entry)
+                    continue
+                del self.pending_jobs[(job.ocr_type, job.digest)]
+                self.waits_ms.append((time.perf_counter() - job.submitted_at) * 1000)
+                batch.append(job)
+            for entry in skipped:
+                heapq.heappush(self.queue, entry)
+            if not batch:
+                self.running -= 1
+            return batch
+
+    def on_done(self, jobs, texts):
+        finished = []
+        with self.lock:
+            for job, text in zip(jobs, texts):
+                for image_index, generation, slot in job.waiters:
+                    key = (image_index, generation, job.ocr_type)
+                    results = self.partial_results.get(key)
+                    if results is None:
+                        continue  # Superseded by a newer submit for this image
+                    results[slot] = text
+                    if all(r is not None for r in results):
+                        del self.partial_results[key]
+                        finished.append(('\n'.join(r for r in results if r), job.ocr_type, image_index))
+        for text, ocr_type, image_index in finished:
+            self.result.emit(text, ocr_type, image_index)
+        self.emit_stats()
+
+    def queue_depth(self):
+        with self.lock:
+            return len(self.pending_jobs)
+
+    def average_wait_ms(self):
+        with self.lock:
+            return sum(self.waits_ms) / len(self.waits_ms) if self.waits_ms else 0.0
+
+    def emit_stats(self):
+        self.stats_changed.emit(self.queue_depth(), self.average_wait_ms())
\ No newline at end of file
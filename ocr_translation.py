@@ -1,20 +1,34 @@
 from PyQt5.QtCore import QThread, pyqtSignal
+from translation_memory import translate_texts, get_translation_backend
 
+# Translates every OCR box of every image in one go, so lines repeated between
+# engines and images are translated once. cancel() is cooperative: the worker
+# stops before its next step and emits nothing afterwards.
 class TranslationWorker(QThread):
-    finished = pyqtSignal(str, str)
+    translated = pyqtSignal(str, str, int, int)  # text, status, image index, OCR index
 
-    def __init__(self, text, target_lang):
+    def __init__(self, boxes, target_lang, memory=None, backend=None):
         super().__init__()
-        self.text = text
+        self.boxes = boxes  # (image index, OCR index, text)
         self.target_lang = target_lang
+        self.memory = memory
+        self.backend = backend or get_translation_backend()
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
 
     def run(self):
         try:
-            # Mock translation (replace this with actual translation if possible)
-            translated_text = f"Translated to {self.target_lang}: {self.text}"
-            self.finished.emit(translated_text, 'success')
+            translations = translate_texts([text for _, _, text in self.boxes], self.target_lang,
+                                           self.backend, self.memory)
+            status = 'success'
         except Exception as e:
-            self.finished.emit(str(e), 'error')
+            translations, status = [str(e)] * len(self.boxes), 'error'
+        for (image_index, ocr_index, _), translated_text in zip(self.boxes, translations):
+            if self.cancelled:
+                return
+            self.translated.emit(translated_text, status, image_index, ocr_index)
 
 def perform_translation(parent):
     target_lang = parent.target_lang_combo.currentText()
@@ -23,17 +37,24 @@ def perform_translation(parent):
         for result in translation_result:
             result.clear()
 
+    # Earlier requests finish in the background but can no longer reach the UI.
+    # A worker is only released once its thread has fully finished.
+    parent.translation_workers[:] = [worker for worker in parent.translation_workers if not worker.isFinished()]
     for worker in parent.translation_workers:
-        if worker.isRunning():
-            worker.terminate()
-    parent.translation_workers.clear()
+        if not worker.cancelled:
+            worker.cancel()
+            worker.translated.disconnect()
 
+    boxes = []
     for i, ocr_result in enumerate(parent.ocr_results):
         for j, result in enumerate(ocr_result):
             text = result.toPlainText()
             if text:
-                worker = TranslationWorker(text, target_lang)
-                worker.finished.connect(lambda translated_text, status, idx=i, ocr_idx=j: 
-                                        parent.update_translation_result(translated_text, status, idx, ocr_idx))
-                worker.start()
-                parent.translation_workers.append(worker)
\ No newline at end of file
+                boxes.append((i, j, text))
+    if not boxes:
+        return
+
+    worker = TranslationWorker(boxes, target_lang, parent.translation_memory)
+    worker.translated.connect(parent.update_translation_result)
+    worker.start()
+    parent.translation_workers.append(worker)
\ No newline at end of file
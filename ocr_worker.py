@@ -1,34 +1,21 @@
 from PyQt5.QtCore import QThread, pyqtSignal
-import cv2
-import pytesseract
-import easyocr
-import torch
+from ocr_engines import recognize_batch
 
 class OCRWorker(QThread):
     finished = pyqtSignal(str, str)
 
-    def __init__(self, image, ocr_type):
+    def __init__(self, image, ocr_type, languages=('en',), preprocess=False):
         super().__init__()
         self.image = image
         self.ocr_type = ocr_type
+        self.languages = languages
+        self.preprocess = preprocess
         print(f"Initializing OCRWorker with {ocr_type}, image shape: {image.shape}")
-        if ocr_type == 'EasyOCR':
-            # Initialize EasyOCR with GPU support if available
-            self.reader = easyocr.Reader(['en'], gpu=True)
-        elif ocr_type == 'Tesseract':
-            # Specify the path to Tesseract executable
-            pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
     def run(self):
         print(f"Running OCR with {self.ocr_type}")
         try:
-            if self.ocr_type == 'EasyOCR':
-                # Perform OCR using EasyOCR
-                ocr_text = self.reader.readtext(self.image, detail=0)
-                result = '\n'.join(ocr_text)
-            elif self.ocr_type == 'Tesseract':
-                # Perform OCR using Tesseract
-                result = pytesseract.image_to_string(self.image)
+            result = recognize_batch([self.image], self.ocr_type, self.languages, preprocess=self.preprocess)[0]
             print(f"OCR result: {result[:100] if result else 'None'}")
             self.finished.emit(result, self.ocr_type)
         except Exception as e:
@@ -0,0 +1,68 @@
+import threading
+import time
+import ollama
+
+LLAVA_MODEL = "llava-llama3"
+LLAVA_PROMPT = 'Describe the image: I want the data presented in this way: Name, HP, Card number'
+# How long the server keeps the model loaded after a request
+LLAVA_KEEP_ALIVE = '30m'
+# Seconds without any response data before a request fails, and for a whole answer
+LLAVA_READ_TIMEOUT = 60
+LLAVA_TOTAL_TIMEOUT = 300
+
+# One ollama.Client per host. Each wraps an httpx connection pool, so repeated
+# requests reuse the same keep-alive connection instead of reconnecting.
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_ollama_client(host=None):
+    with _clients_lock:
+        client = _clients.get(host)
+        if client is None:
+            client = ollama.Client(host=host, timeout=LLAVA_READ_TIMEOUT)
+            _clients[host] = client
+        return client
+
+def warm_up_model(model=LLAVA_MODEL, host=None):
+    # A generate request without a prompt makes the server load the model
+    def load():
+        try:
+            get_ollama_client(host).generate(model=model, keep_alive=LLAVA_KEEP_ALIVE)
+            print(f"Ollama model {model} loaded")
+        except Exception as e:
+            print(f"Error warming up {model}: {str(e)}")
+
+    thread = threading.Thread(target=load, name='ollama-warmup', daemon=True)
+    thread.start()
+    return thread
+
+def stream_analysis(base64_image, model=LLAVA_MODEL, prompt=LLAVA_PROMPT, host=None, options=None,
+                    cancelled=None, timeout=LLAVA_TOTAL_TIMEOUT):
+    # Yields the answer piece by piece as the server generates it. Stops (and
+    # closes the connection, which ends generation server-side) once
+    # cancelled() returns True.
+    started = time.perf_counter()
+    stream = get_ollama_client(host).chat(
+        model=model,
+        messages=[
+            {
+                'role': 'user',
+                'content': prompt,
+                'images': [base64_image]
+            }
+        ],
+        stream=True,
+        options=options,
+        keep_alive=LLAVA_KEEP_ALIVE,
+    )
+    try:
+        for part in stream:
+            if cancelled is not None and cancelled():
+                return
+            if time.perf_counter() - started > timeout:
+                raise TimeoutError(f"No complete answer from {model} after {timeout} s")
+            content = part['message']['content']
+            if content:
+                yield content
+    finally:
+        stream.close()
\ No newline at end of file
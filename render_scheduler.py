@@ -0,0 +1,117 @@
+import os
+import time
+from collections import deque
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal, pyqtSlot
+
+class RenderSignals(QObject):
+    result = pyqtSignal(int, int, object)  # generation, image index, rendered image
+    finished = pyqtSignal(int, int)  # generation, image index
+
+class RenderWorker(QRunnable):
+    def __init__(self, generation, image_index, render, is_current):
+        super().__init__()
+        self.generation = generation
+        self.image_index = image_index
+        self.render = render
+        self.is_current = is_current
+        self.signals = RenderSignals()
+
+    @pyqtSlot()
+    def run(self):
+        # Superseded while still queued, don't bother rendering
+        if self.is_current(self.generation):
+            try:
+                image = self.render()
+                self.signals.result.emit(self.generation, self.image_index, image)
+            except Exception as e:
+                print(f"RenderWorker: Error rendering image {self.image_index}: {str(e)}")
+        self.signals.finished.emit(self.generation, self.image_index)
+
+# Runs renders off the GUI thread, one image per pool thread. Only the newest
+# request is kept: while a render is running, further submits just replace the
+# pending one, and results from superseded requests are dropped instead of
+# being published.
+class RenderScheduler(QObject):
+    frame_ready = pyqtSignal(int, object)  # image index, rendered image
+    render_finished = pyqtSignal()
+    stats_changed = pyqtSignal(float, float, float)  # renders per second, latency ms, GUI stall ms
+
+    HEARTBEAT_MS = 100
+
+    def __init__(self, parent=None, max_workers=None):
+        super().__init__(parent)
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(max_workers or os.cpu_count() or 1)
+        self.generation = 0
+        self.pending = None
+        self.active_workers = {}
+        self.submitted_at = 0.0
+        self.completed_at = deque(maxlen=60)
+        self.latency_ms = 0.0
+        self.stall_ms = 0.0
+
+        # A GUI-thread timer that fires late means the event loop was blocked
+        self.last_beat = time.perf_counter()
+        self.heartbeat = QTimer(self)
+        self.heartbeat.timeout.connect(self.on_heartbeat)
+        self.heartbeat.start(self.HEARTBEAT_MS)
+
+    def is_current(self, generation):
+        return generation == self.generation
+
+    def submit(self, jobs):
+        # jobs: list of (image index, zero-argument callable returning the image)
+        self.generation += 1
+        self.submitted_at = time.perf_counter()
+        self.pending = (self.generation, jobs)
+        if not self.active_workers:
+            self.start_pending()
+
+    def start_pending(self):
+        generation, jobs = self.pending
+        self.pending = None
+        for image_index, render in jobs:
+            worker = RenderWorker(generation, image_index, render, self.is_current)
+            worker.signals.result.connect(self.on_result)
+            worker.signals.finished.connect(self.on_finished)
+            self.active_workers[image_index] = worker
+        for worker in list(self.active_workers.values()):
+            self.thread_pool.start(worker)
+        if not self.active_workers:
+            self.complete(generation)
+
+    def on_result(self, generation, image_index, image):
+        if self.is_current(generation):
+            self.frame_ready.emit(image_index, image)
+
+    def on_finished(self, generation, image_index):
+        self.active_workers.pop(image_index, None)
+        if not self.active_workers:
+            self.complete(generation)
+
+    def complete(self, generation):
+        if self.is_current(generation):
+            now = time.perf_counter()
+            self.latency_ms = (now - self.submitted_at) * 1000
+            self.completed_at.append(now)
+            self.render_finished.emit()
+            self.emit_stats()
+        if self.pending is not None:
+            self.start_pending()
+
+    def renders_per_second(self):
+        now = time.perf_counter()
+        recent = [t for t in self.completed_at if now - t <= 1.0]
+        return float(len(recent))
+
+    def on_heartbeat(self):
+        now = time.perf_counter()
+        self.stall_ms = max(0.0, (now - self.last_beat) * 1000 - self.HEARTBEAT_MS)
+        self.last_beat = now
+        self.emit_stats()
+
+    def emit_stats(self):
+        self.stats_changed.emit(self.renders_per_second(), self.latency_ms, self.stall_ms)
+
+    def wait_for_done(self, msecs=-1):
+        return self.thread_pool.waitForDone(msecs)
\ No newline at end of file
@@ -0,0 +1,62 @@
+import threading
+from collections import OrderedDict
+
+# LRU store for intermediate process_image outputs, shared by every loaded image
+# and bounded by the total bytes of the arrays it holds. Stored arrays are made
+# read-only, since later renders hand them straight to the next stage.
+class StageCache:
+    def __init__(self, max_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            img = self.entries.get(key)
+            if img is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return img
+
+    def put(self, key, img):
+        if img.nbytes > self.max_bytes:
+            return
+        img.setflags(write=False)
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous.nbytes
+            self.entries[key] = img
+            self.total_bytes += img.nbytes
+            self.evict()
+
+    def evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            _, img = self.entries.popitem(last=False)
+            self.total_bytes -= img.nbytes
+
+    def set_max_bytes(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.evict()
+
+    def discard(self, cache_key):
+        # Drop every stage output rendered from the given source
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == cache_key]:
+                self.total_bytes -= self.entries.pop(key).nbytes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.total_bytes,
+                    'hits': self.hits, 'misses': self.misses}
\ No newline at end of file
@@ -0,0 +1,72 @@
+import numpy as np
+from image_processing import STAGES, stage_keys, output_size
+
+# Above this many pixels full-size renders are done in strips, bypassing the stage cache
+TILED_PROCESSING_PIXELS = 40 * 1000 * 1000
+
+# Rotation and flip move whole rows and columns, so instead of running them on
+# each strip the strips are written through a rotated/flipped view of the output.
+GEOMETRIC_STAGES = ('rotation', 'flip')
+
+# Canny's hysteresis can follow an edge across any distance, so with edge
+# detection on the tiled result is not exact: an edge chain that leaves a strip's
+# halo and comes back can be kept or dropped differently at a seam, changing a
+# few overlay pixels there by up to 128 levels. With this halo and strips of at
+# least MIN_TILE_ROWS, no seam pixel differed from process_image on the random
+# and blurred test images tried (with a 16 row halo and 64 row strips a few did).
+CANNY_HALO = 32
+MIN_TILE_ROWS = 4 * CANNY_HALO
+
+def stage_halo(params):
+    # Rows of context a strip needs on each side for the neighbourhood stages
+    # to give the same result as a whole-image render
+    halo = 0
+    if params.blur > 0:
+        halo += params.blur
+    if params.sharpen > 0:
+        halo += 1
+    if params.edge_detection > 0:
+        halo += CANNY_HALO
+    return halo
+
+def allocate_output(shape, path=None):
+    # In-memory destination, or a memory-mapped .npy file when a path is given
+    if path is None:
+        return np.empty(shape, dtype=np.uint8)
+    return np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=shape)
+
+def source_order_view(out, params):
+    # View of out indexed like the source image before rotation and flip
+    view = out
+    if params.flip == 1:
+        view = view[:, ::-1]
+    elif params.flip == 2:
+        view = view[::-1]
+    if params.rotation > 0:
+        view = np.rot90(view, k=-params.rotation)
+    return view
+
+def process_image_tiled(img, params, out=None, tile_rows=512):
+    # Same result as process_image (apart from Canny seams, see CANNY_HALO), but
+    # the pointwise and neighbourhood stages run on horizontal strips (plus halo
+    # rows) that are streamed into out, so the temporaries only ever cover one strip.
+    if tile_rows < MIN_TILE_ROWS:
+        raise ValueError(f"tile_rows must be at least {MIN_TILE_ROWS}")
+    height = img.shape[0]
+    if out is None:
+        width, out_height = output_size(img.shape, params)
+        out = allocate_output((out_height, width) + img.shape[2:])
+    view = source_order_view(out, params)
+    keys = stage_keys(params)
+    halo = stage_halo(params)
+
+    for top in range(0, height, tile_rows):
+        bottom = min(top + tile_rows, height)
+        strip_top = max(0, top - halo)
+        strip = img[strip_top:min(height, bottom + halo)]
+        for (name, _, apply, _), key in zip(STAGES, keys):
+            if key is not None and name not in GEOMETRIC_STAGES:
+                strip = apply(strip, key)
+        view[top:bottom] = strip[top - strip_top:bottom - strip_top]
+
+    return out
\ No newline at end of file
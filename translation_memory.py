@@ -0,0 +1,119 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+TRANSLATION_SOURCE_LANGUAGE = 'en'
+# 'mock' is a local stand-in that needs no network; 'translate' uses the
+# translate package (MyMemory by default). IMAGE_EDITOR_TRANSLATOR overrides it.
+TRANSLATION_BACKEND = os.environ.get('IMAGE_EDITOR_TRANSLATOR', 'mock')
+
+def split_segments(text):
+    # OCR output is one text line per detected line, so lines are the unit that
+    # repeats between engines and images
+    return [segment for segment in (re.sub(r'\s+', ' ', line).strip() for line in text.splitlines()) if segment]
+
+class MockBackend:
+    name = 'mock'
+
+    def translate_batch(self, segments, source_lang, target_lang):
+        return [f"[{target_lang}] {segment}" for segment in segments]
+
+class TranslateBackend:
+    name = 'translate'
+
+    def __init__(self):
+        self.translators = {}
+        self.lock = threading.Lock()
+
+    def translator(self, source_lang, target_lang):
+        with self.lock:
+            translator = self.translators.get((source_lang, target_lang))
+            if translator is None:
+                from translate import Translator
+                translator = Translator(to_lang=target_lang, from_lang=source_lang)
+                self.translators[(source_lang, target_lang)] = translator
+            return translator
+
+    def translate_batch(self, segments, source_lang, target_lang):
+        translator = self.translator(source_lang, target_lang)
+        # One request for the whole batch; the service keeps line breaks, and if
+        # it ever merges lines each segment is sent on its own instead
+        translated = translator.translate('\n'.join(segments)).split('\n')
+        if len(translated) != len(segments):
+            translated = [translator.translate(segment) for segment in segments]
+        return [line.strip() for line in translated]
+
+TRANSLATION_BACKENDS = {'mock': MockBackend, 'translate': TranslateBackend}
+_backends = {}
+
+def get_translation_backend(name=TRANSLATION_BACKEND):
+    if name not in _backends:
+        _backends[name] = TRANSLATION_BACKENDS[name]()
+    return _backends[name]
+
+# Segment translations stored in SQLite per backend and language pair, so a line
+# is only ever sent to the backend once
+class TranslationMemory:
+    def __init__(self, disk_path):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(disk_path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS translation_memory "
+                        "(backend TEXT NOT NULL, source_lang TEXT NOT NULL, target_lang TEXT NOT NULL, "
+                        "segment TEXT NOT NULL, translation TEXT NOT NULL, created REAL NOT NULL, "
+                        "PRIMARY KEY (backend, source_lang, target_lang, segment))")
+        self.db.commit()
+
+    def get_many(self, segments, backend, source_lang, target_lang):
+        found = {}
+        with self.lock:
+            for segment in segments:
+                row = self.db.execute("SELECT translation FROM translation_memory WHERE backend = ? AND "
+                                      "source_lang = ? AND target_lang = ? AND segment = ?",
+                                      (backend, source_lang, target_lang, segment)).fetchone()
+                if row is not None:
+                    found[segment] = row[0]
+            self.hits += len(found)
+            self.misses += len(segments) - len(found)
+        return found
+
+    def put_many(self, translations, backend, source_lang, target_lang):
+        now = time.time()
+        with self.lock:
+            self.db.executemany("INSERT OR REPLACE INTO translation_memory "
+                                "(backend, source_lang, target_lang, segment, translation, created) "
+                                "VALUES (?, ?, ?, ?, ?, ?)",
+                                [(backend, source_lang, target_lang, segment, translation, now)
+                                 for segment, translation in translations.items()])
+            self.db.commit()
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM translation_memory")
+            self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+def translate_texts(texts, target_lang, backend=None, memory=None, source_lang=TRANSLATION_SOURCE_LANGUAGE):
+    # Translates every text line by line. Each distinct line is looked up once in
+    # the memory, and the remaining ones go to the backend as a single batch.
+    backend = backend or get_translation_backend()
+    segmented = [split_segments(text) for text in texts]
+    unique = list(dict.fromkeys(segment for segments in segmented for segment in segments))
+
+    translations = {}
+    if memory is not None:
+        translations = memory.get_many(unique, backend.name, source_lang, target_lang)
+    missing = [segment for segment in unique if segment not in translations]
+    if missing:
+        translated = dict(zip(missing, backend.translate_batch(missing, source_lang, target_lang)))
+        if memory is not None:
+            memory.put_many(translated, backend.name, source_lang, target_lang)
+        translations.update(translated)
+
+    return ['\n'.join(translations[segment] for segment in segments) for segments in segmented]
\ No newline at end of file
@@ -1,18 +1,20 @@
 from PyQt5.QtCore import QThread, pyqtSignal
-from translate import Translator
+from translation_memory import translate_texts, get_translation_backend
 
 class TranslationWorker(QThread):
     finished = pyqtSignal(str, str)
 
-    def __init__(self, text, dest='en'):
+    def __init__(self, text, dest='en', memory=None):
         super().__init__()
         self.text = text
         self.dest = dest
-        self.translator = Translator(to_lang=self.dest)
+        self.memory = memory
+        # Shared backend, so the Translator for each language pair is built once
+        self.backend = get_translation_backend('translate')
 
     def run(self):
         try:
-            translated = self.translator.translate(self.text)
+            translated = translate_texts([self.text], self.dest, self.backend, self.memory)[0]
             self.finished.emit(translated, 'success')
         except Exception as e:
-            self.finished.emit(str(e), 'error')
+            self.finished.emit(str(e), 'error')
\ No newline at end of file
@@ -1,8 +1,10 @@
 from PyQt5.QtWidgets import (QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QSlider, QListWidget,
                              QComboBox, QCheckBox, QGroupBox, QTextEdit, QWidget, QScrollArea, 
                              QSizePolicy, QGridLayout, QTabWidget)
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QSize
 from image_frame import ImageFrame
+from image_processing import ProcessingParams
+from image_store import THUMBNAIL_SIZE
 
 def create_control(control_type, name, min_val=None, max_val=None, default_val=None):
     if control_type == 'slider':
@@ -16,6 +18,28 @@ def create_control(control_type, name, min_val=None, max_val=None, default_val=N
         control.setChecked(default_val)
     return control
 
+def get_processing_params(controls):
+    # Read every processing widget once, on the GUI thread, into an immutable snapshot
+    return ProcessingParams(
+        brightness=controls['Brightness'].value(),
+        contrast=controls['Contrast'].value(),
+        saturation=controls['Saturation'].value(),
+        hue=controls['Hue'].value(),
+        gamma=controls['Gamma'].value(),
+        blur=controls['Blur'].value(),
+        sharpen=controls['Sharpen'].value(),
+        noise=controls['Noise'].value(),
+        edge_detection=controls['Edge Detection'].value(),
+        greyscale=controls['Greyscale'].isChecked(),
+        invert=controls['Invert'].isChecked(),
+        sepia=controls['Sepia'].isChecked(),
+        color_balance_red=controls['Color Balance Red'].value(),
+        color_balance_green=controls['Color Balance Green'].value(),
+        color_balance_blue=controls['Color Balance Blue'].value(),
+        rotation=controls['Rotation'].currentIndex(),
+        flip=controls['Flip'].currentIndex(),
+    )
+
 def create_left_panel(parent):
     left_panel = QVBoxLayout()
     controls = {}
@@ -29,6 +53,7 @@ def create_left_panel(parent):
 
     image_list = QListWidget()
     image_list.setSelectionMode(QListWidget.ExtendedSelection)
+    image_list.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
     image_list.itemSelectionChanged.connect(parent.on_selection_changed)
     file_layout.addWidget(image_list)
 
@@ -86,6 +111,10 @@ def create_left_panel(parent):
     reset_btn.clicked.connect(parent.reset_controls)
     left_panel.addWidget(reset_btn)
 
+    render_stats_label = QLabel("Render: idle")
+    left_panel.addWidget(render_stats_label)
+    controls['Render Stats'] = render_stats_label
+
     left_scroll = QScrollArea()
     left_widget = QWidget()
     left_widget.setLayout(left_panel)
@@ -266,6 +295,12 @@ def create_ocr_controls(parent, controls):
     auto_ocr_checkbox.setChecked(False)
     ocr_layout.addWidget(auto_ocr_checkbox)
 
+    ocr_cache_stats_label = QLabel("OCR cache: 0 hits, 0 misses")
+    ocr_layout.addWidget(ocr_cache_stats_label)
+
+    ocr_queue_stats_label = QLabel("OCR queue: 0 pending")
+    ocr_layout.addWidget(ocr_queue_stats_label)
+
     translate_btn = QPushButton('Show/Hide Translation')
     translate_btn.clicked.connect(parent.toggle_translation_visibility)
     ocr_layout.addWidget(translate_btn)
@@ -277,7 +312,7 @@ def create_ocr_controls(parent, controls):
 
     # Add selection mode dropdown
     selection_mode_combo = QComboBox()
-    selection_mode_combo.addItems(['Rectangle', 'Triangle'])
+    selection_mode_combo.addItems(['Rectangle', 'Triangle', 'Polygon'])
     selection_mode_combo.currentTextChanged.connect(lambda text: parent.set_selection_mode(text.lower()))
     ocr_layout.addWidget(QLabel("Selection Mode"))
     ocr_layout.addWidget(selection_mode_combo)
@@ -285,6 +320,8 @@ def create_ocr_controls(parent, controls):
     ocr_group.setLayout(ocr_layout)
     
     controls['Auto OCR'] = auto_ocr_checkbox
+    controls['OCR Cache Stats'] = ocr_cache_stats_label
+    controls['OCR Queue Stats'] = ocr_queue_stats_label
     controls['Translate'] = translate_btn
     controls['Target Language'] = target_lang_combo
     controls['Selection Mode'] = selection_mode_combo
@@ -296,6 +333,10 @@ def create_llava_controls(parent, controls):
     llava_btn = QPushButton('Perform Llava Analysis')
     llava_btn.clicked.connect(parent.perform_llava_analysis)
     llava_layout.addWidget(llava_btn)
+    refresh_checkbox = QCheckBox("Ignore Cached Answers")
+    refresh_checkbox.setToolTip("Ask the model again and replace the stored answer")
+    llava_layout.addWidget(refresh_checkbox)
     llava_group.setLayout(llava_layout)
     controls['Llava Analysis'] = llava_btn
+    controls['Llava Refresh'] = refresh_checkbox
     return llava_group, llava_btn
\ No newline at end of file
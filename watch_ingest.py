@@ -0,0 +1,233 @@
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+from batch_cli import BatchRunner, IMAGE_EXTENSIONS, add_pipeline_arguments, completed_inputs, load_preset
+
+# One stage of the ingest pipeline: `workers` threads take items from a queue of
+# at most max_queued and pass them on to the next stage. A full queue blocks the
+# stage feeding it, so a slow stage throttles everything upstream of it instead
+# of letting decoded images pile up in memory.
+class Stage:
+    def __init__(self, name, work, workers=1, max_queued=8, on_done=None):
+        self.name = name
+        self.work = work
+        self.workers = workers
+        self.queue = queue.Queue(max_queued)
+        self.next_stage = None
+        self.on_done = on_done  # Called with every item leaving the last stage, failed ones included
+        self.threads = []
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.busy_seconds = 0.0
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.run, name=f"ingest-{self.name}-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if item['record']['status'] == 'ok':
+                started = time.perf_counter()
+                try:
+                    self.work(item)
+                except Exception as e:
+                    item['record']['status'] = 'error'
+                    item['record']['error'] = str(e)
+                    print(f"Error in {self.name} for {item['record']['input']}: {str(e)}")
+                elapsed = time.perf_counter() - started
+                item['timings'][self.name] = elapsed
+                with self.lock:
+                    self.completed += 1
+                    self.busy_seconds += elapsed
+            if self.next_stage is not None:
+                self.next_stage.queue.put(item)
+            elif self.on_done is not None:
+                self.on_done(item)
+
+    def stop(self):
+        # Called after everything upstream has stopped: the end markers queue up
+        # behind the remaining items, so those are finished first
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+class IngestPipeline:
+    def __init__(self, args, params):
+        self.args = args
+        self.runner = BatchRunner(args, params)
+        self.submitted = 0
+        self.finished = 0
+        self.count_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.claimed_outputs = set()  # Output names without extension, taken by earlier inputs
+        self.started = time.perf_counter()
+
+        self.stages = [Stage('decode', self.decode, args.decode_workers, args.queue_size),
+                       Stage('process', self.process, args.process_workers, args.queue_size)]
+        if args.ocr:
+            self.stages.append(Stage('ocr', self.ocr, args.ocr_workers, args.queue_size))
+        if args.llava:
+            self.stages.append(Stage('llava', self.llava, args.llava_concurrency, args.queue_size))
+        self.stages.append(Stage('write', self.output, 1, args.queue_size, on_done=self.record))
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.next_stage = next_stage
+
+    def decode(self, item):
+        item['img'] = self.runner.decode(item['record']['input'])
+
+    def process(self, item):
+        item['result'] = self.runner.render(item['img'])
+        if not (self.args.ocr and self.args.ocr_from_source):
+            del item['img']  # Only OCR from source still needs the decoded file
+
+    def ocr(self, item):
+        item['record']['ocr'] = self.runner.run_ocr(item.pop('img', None), item['result'])
+
+    def llava(self, item):
+        item['record']['llava'] = self.runner.run_llava(item['result'])
+
+    def output(self, item):
+        if self.args.output_dir and item['record']['status'] == 'ok':
+            item['record']['output'] = self.runner.write_output(item['result'], item['output_name'])
+
+    def record(self, item):
+        item.pop('img', None)
+        item.pop('result', None)
+        self.runner.record_result(item['record'], item['timings'])
+        with self.count_lock:
+            self.finished += 1
+
+    def claim_output_name(self, output_name):
+        # Inputs that only differ in extension (scan.jpg, scan.png) would write the
+        # same output file, so later ones get scan_1, scan_2, ...
+        stem, extension = os.path.splitext(output_name)
+        candidate = stem
+        suffix = 0
+        while os.path.normcase(candidate) in self.claimed_outputs:
+            suffix += 1
+            candidate = f"{stem}_{suffix}"
+        self.claimed_outputs.add(os.path.normcase(candidate))
+        return candidate + extension
+
+    def submit(self, path, output_name):
+        claimed = self.claim_output_name(output_name)
+        if claimed != output_name:
+            print(f"Output for {output_name} would overwrite an earlier one, writing it as {os.path.splitext(claimed)[0] + self.args.format}")
+        item = {'record': self.runner.new_record(path), 'output_name': claimed, 'timings': {}}
+        with self.count_lock:
+            self.submitted += 1
+        # Blocks while the decode queue is full; the file simply waits on disk
+        self.stages[0].queue.put(item)
+
+    def in_flight(self):
+        with self.count_lock:
+            return self.submitted - self.finished
+
+    def scan(self):
+        # Image files under the watch directory as {path: (size, mtime)}
+        found = {}
+        for root, dirs, files in os.walk(self.args.directory):
+            if not self.args.recursive:
+                dirs.clear()
+            for name in files:
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue  # Removed while scanning
+                    found[path] = (stat.st_size, stat.st_mtime)
+        return found
+
+    def watch(self):
+        # Polls instead of using file system events, which network shares often
+        # do not deliver. A file is only taken once its size and mtime have not
+        # changed between two polls, so files still being copied are left alone.
+        seen = set() if self.args.no_resume else completed_inputs(self.args.results, self.runner.params_id)
+        for path in sorted(seen):
+            # Outputs written by an earlier run keep their names
+            self.claim_output_name(os.path.relpath(path, self.args.directory))
+        previous = {}
+        last_activity = time.time()
+        last_stats = time.time()
+        while not self.stop_event.is_set():
+            current = self.scan()
+            for path, state in sorted(current.items()):
+                if path not in seen and previous.get(path) == state:
+                    seen.add(path)
+                    self.submit(path, os.path.relpath(path, self.args.directory))
+                    last_activity = time.time()
+            previous = current
+
+            if self.in_flight():
+                last_activity = time.time()
+            elif self.args.exit_when_idle is not None and time.time() - last_activity >= self.args.exit_when_idle:
+                print(f"No new files for {self.args.exit_when_idle} s, stopping")
+                return
+            if time.time() - last_stats >= self.args.stats_interval:
+                self.print_stats()
+                last_stats = time.time()
+            self.stop_event.wait(self.args.poll_interval)
+
+    def utilisation(self, stage):
+        # Share of the stage's worker time spent working; the busiest stage is the
+        # one holding back everything upstream of it
+        elapsed = time.perf_counter() - self.started
+        with stage.lock:
+            busy_seconds = stage.busy_seconds
+        return busy_seconds / (elapsed * stage.workers) if elapsed > 0 else 0.0
+
+    def print_stats(self):
+        stages = ', '.join(f"{stage.name} {stage.completed} done/{stage.queue.qsize()} queued/"
+                           f"{self.utilisation(stage):.0%} busy" for stage in self.stages)
+        print(f"Ingest: {self.finished} finished, {self.in_flight()} in flight; {stages}")
+
+    def run(self):
+        print(f"Watching {self.args.directory} (every {self.args.poll_interval} s); stages: "
+              + ' -> '.join(f"{stage.name} x{stage.workers}" for stage in self.stages))
+        self.started = time.perf_counter()
+        for stage in self.stages:
+            stage.start()
+        with self.runner.open_results():
+            try:
+                self.watch()
+            except KeyboardInterrupt:
+                print("Stopping, finishing files already in the pipeline")
+            for stage in self.stages:
+                stage.stop()
+        self.runner.print_summary(time.perf_counter() - self.started)
+        print("Stage utilisation: " + ', '.join(f"{stage.name} {self.utilisation(stage):.0%} (x{stage.workers})"
+                                                for stage in self.stages))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Watch a directory and process every new image as it arrives")
+    parser.add_argument('directory', help="directory to watch")
+    parser.add_argument('--recursive', action='store_true', help="also watch subdirectories")
+    parser.add_argument('--poll-interval', type=float, default=2.0, help="seconds between directory scans")
+    parser.add_argument('--exit-when-idle', type=float,
+                        help="stop after this many seconds without new files and with the pipeline empty")
+    parser.add_argument('--stats-interval', type=float, default=30.0, help="seconds between progress lines")
+    parser.add_argument('--queue-size', type=int, default=8, help="items waiting in front of each stage")
+    parser.add_argument('--decode-workers', type=int, default=2)
+    parser.add_argument('--process-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--ocr-workers', type=int, default=1)
+    add_pipeline_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    pipeline = IngestPipeline(args, load_preset(args.preset))
+    pipeline.run()
+    return 1 if pipeline.runner.failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file